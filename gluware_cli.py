@@ -0,0 +1,396 @@
+# /* Copyright (C) 2019 Gluware - All Rights Reserved
+# * This code is provided “as is” with no implied warranties or fitness
+# * for a particular purpose. Gluware, Inc. is under no obligation to
+# * provide maintenance, support, updates, enhancements or modifications.
+# */
+
+# REQUIRED PYTHON VERSION: 3.x
+# Supports Gluware REST API v1
+# Required Python modules:
+# requests, urllib3 (through gluware_device_rest_api_client.py)
+
+# Non-interactive command line interface to the Gluware Device REST API, for scripted and batch runs.
+# Results are written to stdout as JSON lines, one per device, organization or operation, as they become available.
+#
+# Connection settings are read, in increasing order of precedence, from the [gluware] section of a config file
+# (--config, default ~/.gluware.ini), from the environment and from command line options:
+#     host       GLUWARE_HOST       --host       Gluware Control hostname, IP or URL
+#     username   GLUWARE_USERNAME   --username
+#     password   GLUWARE_PASSWORD   --password
+#     ca_file    GLUWARE_CA_FILE    --ca-file    CA certificate used to validate the host (default: no validation)
+#
+# Commands:
+#     devices list [--org ORG_ID] [--query KEY=VALUE ...]    streams matching devices
+#     devices list --subtree ORG                             streams the devices of an organization (id or path)
+#                                                            and of every organization below it
+#     devices export --output FILE [--format FORMAT]         writes matching devices (--org, --query as for list) to
+#                    [--fields FIELD,...]                    FILE as jsonl, csv or parquet, optionally projected to
+#                                                            the given dotted fields and compressed by the .gz, .bz2
+#                                                            or .xz extension of FILE (see gluware_device_export.py)
+#     devices get [ID ...]                                   devices by id (ids from stdin when none are given)
+#     devices create [--from FILE]                           creates one device per input record
+#     devices update [--from FILE]                           updates devices; each input record must have an "id"
+#     devices reconcile [--from FILE] [--dry-run]            brings devices to the desired state in each input record
+#                                                            (which must have an "id"), sending only the fields that
+#                                                            differ; writes the differences found per device
+#     devices delete [ID ...] [--from FILE]                  deletes devices by id
+#     devices discover [ID ...] [--org ORG_ID] [--wait]      triggers discovery for the given devices or for every
+#                                                            device in an organization; --wait tracks each discovery
+#                                                            to completion and reports the final status
+#     orgs list                                              all organizations, with their full path
+#     orgs resolve [PATH ...]                                organization ids by path, e.g.
+#                                                            GluwareSystemOrganization/Lab/US (paths from stdin when
+#                                                            none are given)
+#
+# Input records are read from --from FILE, or from stdin when FILE is omitted or "-". CSV files (.csv or
+# --format csv) have one device per row; dotted column names such as connectionInformation.ip become nested
+# objects, cells holding a JSON list or object are decoded, and the extra column of gluware_device_export.py
+# is expanded back into fields. Otherwise each input line is a JSON object (JSONL), or for id inputs a JSON
+# object with an "id" or a bare id. Create, update, delete and get run on --workers parallel workers (default 16).
+#
+# Example:
+#     export GLUWARE_HOST=gluware.example.com GLUWARE_USERNAME=admin GLUWARE_PASSWORD=...
+#     python gluware_cli.py devices create --from site42.csv > results.jsonl
+#     python gluware_cli.py devices list --org 565a65db-54e7-4461-a954-f0f38f310e19 | jq .name
+
+import argparse
+import concurrent.futures
+import configparser
+import csv
+import json
+import os
+import sys
+
+ENVIRONMENT_SETTINGS = {"host": "GLUWARE_HOST", "username": "GLUWARE_USERNAME", "password": "GLUWARE_PASSWORD",
+                        "ca_file": "GLUWARE_CA_FILE"}
+# gluware_device_export.EXTRA_COLUMN; not imported, since that module needs Python 3.10
+EXPORT_EXTRA_COLUMN = "extra"
+
+
+def load_settings(args):
+    settings = {}
+    config = configparser.ConfigParser()
+    config.read(os.path.expanduser(args.config))
+    if config.has_section("gluware"):
+        settings.update(config["gluware"])
+    for name, variable in ENVIRONMENT_SETTINGS.items():
+        if os.environ.get(variable):
+            settings[name] = os.environ[variable]
+    for name in ENVIRONMENT_SETTINGS:
+        if getattr(args, name, None):
+            settings[name] = getattr(args, name)
+    missing = [name for name in ("host", "username", "password") if not settings.get(name)]
+    if missing:
+        raise SystemExit("Missing connection settings: " + ", ".join(missing))
+    return settings
+
+
+def create_client(args):
+    # Imported here so that importing this module, or running --help, does no client setup at all
+    import gluware_device_rest_api_client
+    settings = load_settings(args)
+    host = settings["host"]
+    if "://" not in host:
+        host = "https://" + host
+    return gluware_device_rest_api_client.APIClient(host, settings["username"], settings["password"], "",
+                                                    settings.get("ca_file"))
+
+
+def write(record):
+    sys.stdout.write(json.dumps(record) + "\n")
+    sys.stdout.flush()
+
+
+def result_record(result, **extra):
+    record = dict(extra)
+    record["response_code"] = result["response_code"]
+    record["response_content"] = result["response_content"]
+    return record
+
+
+def unflatten(row):
+    # {"connectionInformation.ip": "10.0.0.1"} -> {"connectionInformation": {"ip": "10.0.0.1"}}
+    record = {}
+    for key, value in row.items():
+        if key is None or value is None or value == "":
+            continue
+        if value[:1] in ("[", "{"):
+            # Lists and objects are written as JSON, as by gluware_device_export.py
+            try:
+                value = json.loads(value)
+            except ValueError:
+                pass
+        # The extra column of gluware_device_export.py holds {dotted field: value} for fields without a column
+        fields = value.items() if key == EXPORT_EXTRA_COLUMN and isinstance(value, dict) else ((key, value),)
+        for name, field_value in fields:
+            target = record
+            parts = name.split(".")
+            for part in parts[:-1]:
+                target = target.setdefault(part, {})
+            target[parts[-1]] = field_value
+    return record
+
+
+def read_records(args):
+    path = getattr(args, "source", None)
+    stream = sys.stdin if path in (None, "-") else open(path, newline="")
+    try:
+        use_csv = args.format == "csv" or (args.format is None and path is not None and path.endswith(".csv"))
+        if use_csv:
+            for row in csv.DictReader(stream):
+                yield unflatten(row)
+        else:
+            for line in stream:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def read_ids(args):
+    if args.ids:
+        yield from args.ids
+        return
+    for record in read_records(args):
+        yield record["id"] if isinstance(record, dict) else str(record)
+
+
+def read_lines(values):
+    if values:
+        yield from values
+        return
+    for line in sys.stdin:
+        line = line.strip()
+        if line:
+            yield line
+
+
+def devices_list(client, args):
+    if args.subtree:
+        import gluware_organization_tree
+        tree = gluware_organization_tree.OrganizationTree.from_client(client)
+        try:
+            devices = tree.subtree_devices(client, args.subtree, max_workers=args.workers)
+            for device in devices:
+                write(device)
+        except gluware_organization_tree.UnresolvedOrganizationError as e:
+            # Refuse to report a subtree that may be missing organizations
+            raise SystemExit(str(e))
+        return
+    query = dict(item.split("=", 1) for item in args.query or [])
+    if args.org:
+        query["orgId"] = args.org
+    for device in client.iter_devices(query or None, page_size=args.page_size):
+        write(device)
+
+
+def devices_export(client, args):
+    import gluware_device_export
+    query = dict(item.split("=", 1) for item in args.query or [])
+    if args.org:
+        query["orgId"] = args.org
+    output = sys.stdout.buffer if args.output == "-" else args.output
+    fields = args.fields.split(",") if args.fields else None
+    count = gluware_device_export.export_client_devices(client, output, query or None, page_size=args.page_size,
+                                                        format=args.format, fields=fields,
+                                                        compression=args.compression)
+    return {"operation": "export", "total": count, "failed": 0}
+
+
+def devices_get(client, args):
+    results = client.bulk_get_devices(read_ids(args), max_workers=args.workers)
+    for result in results:
+        write(result_record(result, index=result["index"], id=result["item"]))
+    return results.summary()
+
+
+def devices_create(client, args):
+    results = client.bulk_create_devices(read_records(args), max_workers=args.workers)
+    for result in results:
+        write(result_record(result, index=result["index"], name=result["item"].get("name")))
+    return results.summary()
+
+
+def records_with_ids(args, invalid, positions):
+    # Yields the input records that have an "id". The others are reported straight away and collected in
+    # invalid; positions maps the index of each yielded record to its index in the input
+    for index, record in enumerate(read_records(args)):
+        if not isinstance(record, dict) or record.get("id") in (None, ""):
+            failure = {"index": index, "item": record, "response_code": None,
+                       "response_content": "Input record has no id"}
+            invalid.append(failure)
+            write(result_record(failure, index=index))
+            continue
+        positions.append(index)
+        yield record
+
+
+def add_invalid(summary, invalid):
+    summary["total"] += len(invalid)
+    summary["failed"] += len(invalid)
+    summary["failures"] = invalid + summary["failures"]
+    return summary
+
+
+def devices_update(client, args):
+    invalid = []
+    positions = []
+    updates = ((record.pop("id"), record) for record in records_with_ids(args, invalid, positions))
+    results = client.bulk_update_devices(updates, max_workers=args.workers)
+    for result in results:
+        write(result_record(result, index=positions[result["index"]], id=result["item"][0]))
+    return add_invalid(results.summary(), invalid)
+
+
+def devices_reconcile(client, args):
+    invalid = []
+    summary = client.reconcile_devices(records_with_ids(args, invalid, []), dry_run=args.dry_run,
+                                       fetch_by_id=args.fetch_by_id, ignore_fields=args.ignore or (),
+                                       max_workers=args.workers)
+    for device_id, changes in summary.pop("diffs").items():
+        write({"id": device_id, "changes": changes})
+    return add_invalid(summary, invalid)
+
+
+def devices_delete(client, args):
+    results = client.bulk_delete_devices(read_ids(args), max_workers=args.workers)
+    for result in results:
+        write(result_record(result, index=result["index"], id=result["item"]))
+    return results.summary()
+
+
+def devices_discover(client, args):
+    if args.org:
+        device_ids = [device["id"] for device in client.iter_devices({"orgId": args.org})]
+    else:
+        device_ids = list(read_ids(args))
+    if args.wait:
+        import gluware_device_discovery
+        # Every device is in the organization, so one listing of it per tick polls them all
+        poll_query = {"orgId": args.org} if args.org else None
+        with gluware_device_discovery.DiscoveryOrchestrator(client, batch_size=args.batch_size,
+                                                            max_in_flight=args.max_in_flight,
+                                                            poll_query=poll_query) as orchestrator:
+            futures = orchestrator.discover(device_ids)
+            # Written from this thread, in completion order, rather than from the orchestrator's callbacks
+            for future in concurrent.futures.as_completed(futures.values()):
+                write_discovery(future)
+        return
+    for start in range(0, len(device_ids), args.batch_size):
+        batch = device_ids[start:start + args.batch_size]
+        write(result_record(client.discover_devices({"devices": batch}), devices=batch))
+
+
+def write_discovery(future):
+    error = future.exception()
+    if error is None:
+        device = future.result()
+        write({"id": device["id"], "discoveryStatus": device.get("discoveryStatus"), "succeeded": True})
+    else:
+        write({"id": getattr(error, "device_id", None), "discoveryStatus": getattr(error, "status", str(error)),
+               "succeeded": False})
+
+
+def orgs_list(client, args):
+    resp = client.get_organizations()
+    if resp["response_code"] != 200:
+        write(result_record(resp))
+        return
+    paths = client.organization_cache.paths()
+    for org in resp["response_content"]:
+        write(dict(org, path=paths.get(org["id"])))
+
+
+def orgs_resolve(client, args):
+    for path in read_lines(args.paths):
+        resp = client.get_organization_by_path(path)
+        if resp["response_code"] == 200:
+            write({"path": path, "response_code": 200, "id": resp["response_content"]["id"]})
+        else:
+            write(result_record(resp, path=path))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Command line interface to the Gluware Device REST API")
+    parser.add_argument("--config", default="~/.gluware.ini", help="config file with a [gluware] section")
+    parser.add_argument("--host")
+    parser.add_argument("--username")
+    parser.add_argument("--password")
+    parser.add_argument("--ca-file", dest="ca_file")
+    parser.add_argument("--workers", type=int, default=16, help="parallel workers for bulk operations")
+    parser.add_argument("--summary", action="store_true", help="print a summary of bulk operations to stderr")
+    groups = parser.add_subparsers(dest="group", required=True)
+
+    def add_input_options(command):
+        command.add_argument("--from", dest="source", metavar="FILE", help="input file (default: stdin)")
+        command.add_argument("--format", choices=("jsonl", "csv"), help="input format (default: by extension)")
+
+    devices = groups.add_parser("devices").add_subparsers(dest="command", required=True)
+    command = devices.add_parser("list")
+    command.add_argument("--org", help="only devices in this organization id")
+    command.add_argument("--query", action="append", metavar="KEY=VALUE", help="device attribute filter")
+    command.add_argument("--page-size", type=int, help="request devices page by page")
+    command.add_argument("--subtree", metavar="ORG", help="all devices in this organization (id or path) and "
+                                                          "every organization below it")
+    command.set_defaults(handler=devices_list)
+    command = devices.add_parser("export")
+    command.add_argument("--output", default="-", metavar="FILE", help="output file (default: stdout)")
+    command.add_argument("--format", choices=("jsonl", "csv", "parquet"), default="jsonl")
+    command.add_argument("--fields", metavar="FIELD,...", help="comma separated dotted fields to export")
+    command.add_argument("--compression", help="gzip, bz2 or xz (default: by extension), or a parquet codec")
+    command.add_argument("--org", help="only devices in this organization id")
+    command.add_argument("--query", action="append", metavar="KEY=VALUE", help="device attribute filter")
+    command.add_argument("--page-size", type=int, help="request devices page by page")
+    command.set_defaults(handler=devices_export)
+    for name, handler in (("get", devices_get), ("delete", devices_delete)):
+        command = devices.add_parser(name)
+        command.add_argument("ids", nargs="*", metavar="ID")
+        add_input_options(command)
+        command.set_defaults(handler=handler)
+    for name, handler in (("create", devices_create), ("update", devices_update)):
+        command = devices.add_parser(name)
+        add_input_options(command)
+        command.set_defaults(handler=handler)
+    command = devices.add_parser("reconcile")
+    command.add_argument("--dry-run", action="store_true", help="report differences without updating devices")
+    command.add_argument("--fetch-by-id", action="store_true", help="fetch each device by id instead of listing all")
+    command.add_argument("--ignore", action="append", metavar="FIELD", help="dotted field path not to compare")
+    add_input_options(command)
+    command.set_defaults(handler=devices_reconcile)
+    command = devices.add_parser("discover")
+    command.add_argument("ids", nargs="*", metavar="ID")
+    command.add_argument("--org", help="discover every device in this organization id")
+    command.add_argument("--wait", action="store_true", help="wait for each discovery to finish")
+    command.add_argument("--batch-size", type=int, default=50)
+    command.add_argument("--max-in-flight", type=int, default=200)
+    add_input_options(command)
+    command.set_defaults(handler=devices_discover)
+
+    orgs = groups.add_parser("orgs").add_subparsers(dest="command", required=True)
+    orgs.add_parser("list").set_defaults(handler=orgs_list)
+    command = orgs.add_parser("resolve")
+    command.add_argument("paths", nargs="*", metavar="PATH")
+    command.set_defaults(handler=orgs_resolve)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    client = create_client(args)
+    try:
+        summary = args.handler(client, args)
+    except BrokenPipeError:
+        # The reader of stdout went away (e.g. "| head"); stop quietly
+        sys.stdout = open(os.devnull, "w")
+        return 1
+    if summary is not None and args.summary:
+        sys.stderr.write(json.dumps(summary) + "\n")
+    if summary is not None and (summary["failed"] or summary.get("missing")):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+# /* Copyright (C) 2019 Gluware - All Rights Reserved
+# * This code is provided “as is” with no implied warranties or fitness
+# * for a particular purpose. Gluware, Inc. is under no obligation to
+# * provide maintenance, support, updates, enhancements or modifications.
+# */
+
+# REQUIRED PYTHON VERSION: 3.9+
+# Supports Gluware REST API v1
+# Required Python modules:
+# requests, urllib3 (through gluware_device_rest_api_client.py)
+
+# Offline benchmark for APIClient. It starts gluware_mock_controller.py in a separate process (so that the
+# server's own work and memory are not measured) and runs a set of scenarios against it, reporting for each:
+#     requests/sec, p50/p95/p99 request latency (from the client's RequestMetrics), wall time, and peak Python
+#     memory allocated by the client while the scenario ran (tracemalloc)
+#
+# Scenarios:
+#     get_devices              one full device list download, decoded in one piece
+#     iter_devices             the same list, streamed and decoded incrementally
+#     get_organization_by_name --lookups name lookups against the organization cache
+#     get_organization_by_name_uncached  the same lookups with the organization cache disabled
+#     create_update_delete     --operations create, update and delete calls in a sequential loop
+#     bulk_create_update_delete the same operations through the bulk methods
+#     discovery                discovery of --discoveries devices through DiscoveryOrchestrator
+#
+# Usage:
+#     python gluware_client_benchmark.py --devices 100000 --organizations 5000 --latency 0.002
+#     python gluware_client_benchmark.py --scenario iter_devices --scenario get_devices --json
+# Pass --url to benchmark an already running controller (mock or real) instead of starting one.
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import gluware_device_discovery
+import gluware_device_rest_api_client
+
+
+def scenario_get_devices(client, args):
+    resp = client.get_devices(None)
+    return len(resp["response_content"])
+
+
+def scenario_iter_devices(client, args):
+    return sum(1 for _ in client.iter_devices(None))
+
+
+def _organization_names(client, args):
+    organizations = client.get_organizations()["response_content"]
+    return [(org["name"], org.get("parentName")) for org in organizations[:args.lookups]]
+
+
+def scenario_get_organization_by_name(client, args):
+    names = args.organization_names
+    for index in range(args.lookups):
+        client.get_organization_id_by_name(*names[index % len(names)])
+    return args.lookups
+
+
+def scenario_get_organization_by_name_uncached(client, args):
+    client.organization_cache.ttl = 0
+    return scenario_get_organization_by_name(client, args)
+
+
+def _new_devices(args):
+    return [{"name": "benchmark-{}".format(index), "orgId": args.org_id} for index in range(args.operations)]
+
+
+def scenario_create_update_delete(client, args):
+    ids = [client.create_device(device)["response_content"]["id"] for device in _new_devices(args)]
+    for device_id in ids:
+        client.update_device(device_id, {"description": "benchmark"})
+    for device_id in ids:
+        client.delete_device(device_id)
+    return len(ids) * 3
+
+
+def scenario_bulk_create_update_delete(client, args):
+    ids = [result["response_content"]["id"] for result in client.bulk_create_devices(_new_devices(args))]
+    client.bulk_update_devices((device_id, {"description": "benchmark"}) for device_id in ids).wait()
+    client.bulk_delete_devices(ids).wait()
+    return len(ids) * 3
+
+
+def scenario_discovery(client, args):
+    ids = [device["id"] for device in client.get_devices({"limit": args.discoveries, "offset": 0})["response_content"]]
+    orchestrator = gluware_device_discovery.DiscoveryOrchestrator(client, min_poll_interval=0.1, settle_time=0)
+    with orchestrator:
+        futures = orchestrator.discover(ids)
+    return sum(1 for future in futures.values() if future.done())
+
+
+SCENARIOS = {
+    "get_devices": scenario_get_devices,
+    "iter_devices": scenario_iter_devices,
+    "get_organization_by_name": scenario_get_organization_by_name,
+    "get_organization_by_name_uncached": scenario_get_organization_by_name_uncached,
+    "create_update_delete": scenario_create_update_delete,
+    "bulk_create_update_delete": scenario_bulk_create_update_delete,
+    "discovery": scenario_discovery,
+}
+
+
+def run_scenario(name, url, args):
+    client = gluware_device_rest_api_client.APIClient(url, "benchmark", "benchmark", "", None)
+    metrics = client.enable_metrics()
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    items = SCENARIOS[name](client, args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    client.session.close()
+    endpoints = metrics.snapshot()["endpoints"]
+    request_count = sum(stats["count"] for stats in endpoints.values())
+    samples = []
+    for stats in metrics.endpoints.values():
+        samples.extend(stats.sample)
+    samples.sort()
+
+    def percentile(fraction):
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))] if samples else None
+
+    return {"scenario": name,
+            "items": items,
+            "requests": request_count,
+            "seconds": elapsed,
+            "requests_per_second": request_count / elapsed if elapsed else None,
+            "latency_p50": percentile(0.50),
+            "latency_p95": percentile(0.95),
+            "latency_p99": percentile(0.99),
+            "peak_memory_bytes": peak}
+
+
+def start_mock_controller(args):
+    command = [sys.executable, "gluware_mock_controller.py", "--port", "0", "--devices", str(args.devices),
+               "--organizations", str(args.organizations), "--latency", str(args.latency),
+               "--error-rate", str(args.error_rate), "--discovery-seconds", str(args.discovery_seconds)]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True,
+                               cwd=os.path.dirname(os.path.abspath(__file__)))
+    line = process.stdout.readline()
+    if not line:
+        process.kill()
+        raise RuntimeError("Mock controller failed to start")
+    return process, line.split()[-1]
+
+
+def print_table(results):
+    def ms(value):
+        return "-" if value is None else "{:.2f}".format(value * 1000)
+
+    print("{:<34} {:>9} {:>9} {:>10} {:>9} {:>9} {:>9} {:>11}".format(
+        "scenario", "requests", "seconds", "req/s", "p50 ms", "p95 ms", "p99 ms", "peak MiB"))
+    for result in results:
+        print("{:<34} {:>9} {:>9.2f} {:>10.1f} {:>9} {:>9} {:>9} {:>11.1f}".format(
+            result["scenario"], result["requests"], result["seconds"], result["requests_per_second"] or 0,
+            ms(result["latency_p50"]), ms(result["latency_p95"]), ms(result["latency_p99"]),
+            result["peak_memory_bytes"] / 1048576))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark APIClient against a local mock Gluware Control")
+    parser.add_argument("--url", help="benchmark this controller instead of starting a mock one")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="scenario to run (repeatable, default: all)")
+    parser.add_argument("--devices", type=int, default=10000)
+    parser.add_argument("--organizations", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.001)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--discovery-seconds", type=float, default=0.5)
+    parser.add_argument("--lookups", type=int, default=1000)
+    parser.add_argument("--operations", type=int, default=500)
+    parser.add_argument("--discoveries", type=int, default=200)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    process = None
+    url = args.url
+    if url is None:
+        process, url = start_mock_controller(args)
+    try:
+        setup = gluware_device_rest_api_client.APIClient(url, "benchmark", "benchmark", "", None)
+        args.organization_names = _organization_names(setup, args)
+        args.org_id = setup.get_organizations()["response_content"][0]["id"]
+        results = [run_scenario(name, url, args) for name in (args.scenario or SCENARIOS)]
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results)
+
+
+if __name__ == "__main__":
+    main()
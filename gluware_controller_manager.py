@@ -0,0 +1,278 @@
+# /* Copyright (C) 2019 Gluware - All Rights Reserved
+# * This code is provided “as is” with no implied warranties or fitness
+# * for a particular purpose. Gluware, Inc. is under no obligation to
+# * provide maintenance, support, updates, enhancements or modifications.
+# */
+
+# REQUIRED PYTHON VERSION: 3.x
+# Supports Gluware REST API v1
+# Required Python modules:
+# requests, urllib3 (through gluware_device_rest_api_client.py)
+
+# ControllerManager runs the same operation against several Gluware Control hosts (e.g. one per region) at
+# once, so a fleet-wide query takes about as long as the slowest controller instead of the sum of all of them.
+# It holds one APIClient, with its own pooled session, per controller.
+#
+# - Every call to a controller holds one of that controller's max_concurrency slots, so no controller is sent
+#   more than max_concurrency concurrent operations, however many threads use the manager.
+# - Health is tracked per controller: a call that raises a connection error, or returns a 5xx status or no
+#   status, counts as a failure. After failure_threshold consecutive failures a controller is unhealthy and is
+#   skipped for retry_interval seconds; after that one call is let through to probe it again.
+#
+# add_controller - Creates the APIClient for a controller from its URL and credentials and returns it
+# add_client - Adds an existing APIClient (e.g. one with resilience or the cache enabled)
+# run - Calls an APIClient method (by name) or a function of a client on every controller, or on the
+#       controllers named in controllers=, and yields each result as soon as it completes, tagged with a
+#       "controller" key: {"controller": "emea", "response_code": 200, "response_content": [...]}
+#       A connection error, or a skipped unhealthy controller, is reported with response_code None.
+# get_devices, get_organizations, get_organization_by_path, get_organization_id_by_name - run() shortcuts
+# iter_devices - Merges APIClient.iter_devices from all controllers into one stream of (controller name, device)
+#                pairs, as they arrive. Devices are handed over through a bounded queue, so memory use does not
+#                grow with the number of devices. A controller that fails raises its error from the stream,
+#                or with skip_failed=True is left out (and recorded in its health).
+# health - {controller name: {"healthy", "consecutive_failures", "requests", "failures", "last_error",
+#          "last_success", "last_failure", "latency"}}; latency is a moving average of run() call latency
+#
+# Example:
+#     with ControllerManager() as manager:
+#         manager.add_controller("us", "https://gluware-us.example.com", username, password)
+#         manager.add_controller("emea", "https://gluware-emea.example.com", username, password)
+#         for controller, device in manager.iter_devices():
+#             ...
+
+import concurrent.futures
+import queue
+import threading
+import time
+
+import requests
+
+import gluware_device_rest_api_client
+
+_DONE = object()
+
+
+class ControllerHealth:
+
+    def __init__(self, failure_threshold, retry_interval):
+        self.failure_threshold = failure_threshold
+        self.retry_interval = retry_interval
+        self.consecutive_failures = 0
+        self.requests = 0
+        self.failures = 0
+        self.last_error = None
+        self.last_success = None
+        self.last_failure = None
+        self.latency = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        # Whether a call may be sent now; an unhealthy controller lets a single probe through per retry_interval
+        with self._lock:
+            if self.consecutive_failures < self.failure_threshold:
+                return True
+            if self._probing or time.time() - self.last_failure < self.retry_interval:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self, latency=None):
+        with self._lock:
+            self.requests += 1
+            self.consecutive_failures = 0
+            self.last_success = time.time()
+            self._probing = False
+            if latency is not None:
+                self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+
+    def release(self):
+        # Ends a probe that neither succeeded nor failed, without counting it as a call to the controller
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self, error):
+        with self._lock:
+            self.requests += 1
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_error = error
+            self.last_failure = time.time()
+            self._probing = False
+
+    @property
+    def healthy(self):
+        return self.consecutive_failures < self.failure_threshold
+
+    def snapshot(self):
+        with self._lock:
+            return {"healthy": self.healthy,
+                    "consecutive_failures": self.consecutive_failures,
+                    "requests": self.requests,
+                    "failures": self.failures,
+                    "last_error": self.last_error,
+                    "last_success": self.last_success,
+                    "last_failure": self.last_failure,
+                    "latency": self.latency}
+
+
+class Controller:
+
+    def __init__(self, name, client, max_concurrency, health):
+        self.name = name
+        self.client = client
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.health = health
+
+
+class ControllerManager:
+
+    def __init__(self, max_workers=32, failure_threshold=3, retry_interval=60.0):
+        self.max_workers = max_workers
+        self.failure_threshold = failure_threshold
+        self.retry_interval = retry_interval
+        self.controllers = {}
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add_client(self, name, client, max_concurrency=16):
+        if name in self.controllers:
+            raise ValueError("Controller already added: " + name)
+        health = ControllerHealth(self.failure_threshold, self.retry_interval)
+        self.controllers[name] = Controller(name, client, max_concurrency, health)
+        return client
+
+    def add_controller(self, name, control_url, username, password, certificate_file=None, max_concurrency=16,
+                       **client_options):
+        client = gluware_device_rest_api_client.APIClient(control_url, username, password, "", certificate_file,
+                                                          **client_options)
+        return self.add_client(name, client, max_concurrency)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        for controller in self.controllers.values():
+            controller.client.session.close()
+
+    def health(self):
+        return {name: controller.health.snapshot() for name, controller in self.controllers.items()}
+
+    def _select(self, controllers):
+        if controllers is None:
+            return list(self.controllers.values())
+        return [self.controllers[name] for name in controllers]
+
+    def _call(self, controller, operation, args, kwargs):
+        if not controller.health.acquire():
+            return {"response_code": None,
+                    "response_content": "Skipped unhealthy controller (last error: {})".format(
+                        controller.health.last_error)}
+        with controller.slots:
+            start = time.perf_counter()
+            try:
+                if callable(operation):
+                    result = operation(controller.client, *args, **kwargs)
+                else:
+                    result = getattr(controller.client, operation)(*args, **kwargs)
+            except requests.exceptions.RequestException as e:
+                controller.health.record_failure(str(e))
+                return {"response_code": None, "response_content": str(e)}
+            except BaseException:
+                # Not a controller problem, but the probe slot must not stay taken
+                controller.health.release()
+                raise
+            latency = time.perf_counter() - start
+        if result["response_code"] is None or result["response_code"] >= 500:
+            controller.health.record_failure("HTTP {}".format(result["response_code"]))
+        else:
+            controller.health.record_success(latency)
+        return result
+
+    def run(self, operation, *args, controllers=None, **kwargs):
+        pending = {self._executor.submit(self._call, controller, operation, args, kwargs): controller.name
+                   for controller in self._select(controllers)}
+        try:
+            for future in concurrent.futures.as_completed(pending):
+                result = future.result()
+                result["controller"] = pending[future]
+                yield result
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def get_devices(self, query_details, controllers=None):
+        return self.run("get_devices", query_details, controllers=controllers)
+
+    def get_organizations(self, controllers=None):
+        return self.run("get_organizations", controllers=controllers)
+
+    def get_organization_by_path(self, path, controllers=None):
+        return self.run("get_organization_by_path", path, controllers=controllers)
+
+    def get_organization_id_by_name(self, organization_name, parent_organization_name, controllers=None):
+        return self.run("get_organization_id_by_name", organization_name, parent_organization_name,
+                        controllers=controllers)
+
+    def iter_devices(self, query_details=None, controllers=None, skip_failed=False, queue_size=1000, **options):
+        items = queue.Queue(maxsize=queue_size)
+        stop = threading.Event()
+
+        def put(item):
+            # Gives up when the consumer has gone away, so that producers never block forever on a full queue
+            while not stop.is_set():
+                try:
+                    items.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def produce(controller):
+            try:
+                if not controller.health.acquire():
+                    put((controller.name, gluware_device_rest_api_client.APIClientError(
+                        None, "Skipped unhealthy controller (last error: {})".format(controller.health.last_error))))
+                    return
+                with controller.slots:
+                    try:
+                        for device in controller.client.iter_devices(query_details, **options):
+                            if not put((controller.name, device)):
+                                break
+                    except (requests.exceptions.RequestException,
+                            gluware_device_rest_api_client.APIClientError) as e:
+                        if isinstance(e, requests.exceptions.RequestException) or e.response_code >= 500:
+                            controller.health.record_failure(str(e))
+                        else:
+                            controller.health.record_success()
+                        put((controller.name, e))
+                        return
+                    except BaseException as e:
+                        controller.health.release()
+                        put((controller.name, e))
+                        return
+                controller.health.record_success()
+            finally:
+                put(_DONE)
+
+        # Producers run on their own threads rather than on the shared pool, so that the consumer of this
+        # stream can itself call run() without waiting behind producers blocked on a full queue
+        selected = self._select(controllers)
+        for controller in selected:
+            threading.Thread(target=produce, args=(controller,), daemon=True).start()
+        remaining = len(selected)
+        try:
+            while remaining:
+                item = items.get()
+                if item is _DONE:
+                    remaining -= 1
+                elif isinstance(item[1], BaseException):
+                    if not skip_failed:
+                        raise item[1]
+                else:
+                    yield item
+        finally:
+            stop.set()
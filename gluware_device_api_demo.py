@@ -15,6 +15,7 @@
 #    pip install Menu
 # This file and gluware_device_rest_api_client.py must be in the same directory or in sys.path
 # Usage: python GluwareDeviceAPIDemo
+# For scripted, non-interactive use see gluware_cli.py
 #
 # This demo uses a set of basic text menus to demonstrate various calls to the Gluware Device REST API
 # There are 3 primary submenus: Connection Info, Organizations, and Devices
@@ -107,14 +108,19 @@ def print_org_by_id():
     input("Enter any key to return to menu: ")
 
 
+def stream_devices(query_details):
+    # Devices are printed one at a time as they arrive instead of after the whole list has been downloaded
+    try:
+        for device in client.iter_devices(query_details):
+            pprint.pprint(device)
+    except gluware_device_rest_api_client.APIClientError as e:
+        print("Error")
+        pprint.pprint({"response_code": e.response_code, "response_content": e.response_content})
+
+
 def print_devices():
     if connection_info_is_set():
-        resp = client.get_devices(None)
-        if resp["response_code"] == 200:
-            pprint.pprint(resp["response_content"])
-        else:
-            print("Error")
-            pprint.pprint(resp)
+        stream_devices(None)
     input("Enter any key to return to menu: ")
 
 
@@ -122,12 +128,7 @@ def print_devices_in_org_id():
     if connection_info_is_set():
         org_id = input("Enter Organization ID: ")
         payload = {"orgId": org_id}
-        resp = client.get_devices(payload)
-        if resp["response_code"] == 200:
-            pprint.pprint(resp["response_content"])
-        else:
-            print("Error")
-            pprint.pprint(resp)
+        stream_devices(payload)
     input("Enter any key to return to menu: ")
 
 
@@ -259,26 +260,32 @@ def connection_info_is_set():
         return True
 
 
+def main():
+    menu = Menu()
+    orgs = Menu(title="Organizations")
+    devs = Menu(title="Devices")
+    menu.set_options([("Set Connection Info", set_connection_info), ("Organization", orgs.open),
+                      ("Devices", devs.open), ("Quit", menu.close)])
+    menu.set_title("Gluware API Demo")
+    orgs.set_options([("List All Organizations", print_orgs), ("Retrieve Organization ID by Name", print_orgs_by_name),
+                      ("Retrieve SubOrganization ID By Name", print_sub_org_by_name),
+                      ("Retrieve Organization By ID", print_org_by_id),
+                      ("Close Organizations Sub Menu", orgs.close)])
+    devs.set_options([("List All Devices", print_devices), ("List Devices By Org ID", print_devices_in_org_id),
+                      ("Retrieve Device By ID", print_device_by_id), ("Create Basic Device", create_device),
+                      ("Create Discoverable Device", create_discoverable_device),
+                      ("Discover Device", discover_device), ("Update Device by ID", update_device),
+                      ("Update Device Connection Information", update_device_connection_info),
+                      ("Delete Device by ID", delete_device), ("Close Devices Sub Menu", devs.close)])
+    menu.open()
+
+
 gluware_org_name = ""
 gluware_host_name = ""
 gluware_username = ""
 gluware_password = ""
-client = gluware_device_rest_api_client.APIClient("https://" + gluware_host_name, gluware_username, gluware_password,
-                                                  gluware_org_name, None)
-menu = Menu()
-orgs = Menu(title="Organizations")
-devs = Menu(title="Devices")
-menu.set_options([("Set Connection Info", set_connection_info), ("Organization", orgs.open), ("Devices", devs.open),
-                  ("Quit", menu.close)])
-menu.set_title("Gluware API Demo")
-orgs.set_options([("List All Organizations", print_orgs), ("Retrieve Organization ID by Name", print_orgs_by_name),
-                  ("Retrieve SubOrganization ID By Name", print_sub_org_by_name),
-                  ("Retrieve Organization By ID", print_org_by_id),
-                  ("Close Organizations Sub Menu", orgs.close)])
-devs.set_options([("List All Devices", print_devices), ("List Devices By Org ID", print_devices_in_org_id),
-                  ("Retrieve Device By ID", print_device_by_id), ("Create Basic Device", create_device),
-                  ("Create Discoverable Device", create_discoverable_device),
-                  ("Discover Device", discover_device), ("Update Device by ID", update_device),
-                  ("Update Device Connection Information", update_device_connection_info),
-                  ("Delete Device by ID", delete_device), ("Close Devices Sub Menu", devs.close)])
-menu.open()
+# Created by set_connection_info once connection information has been entered
+client = None
+
+if __name__ == "__main__":
+    main()
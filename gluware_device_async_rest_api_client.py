@@ -0,0 +1,167 @@
+# /* Copyright (C) 2019 Gluware - All Rights Reserved
+# * This code is provided “as is” with no implied warranties or fitness
+# * for a particular purpose. Gluware, Inc. is under no obligation to
+# * provide maintenance, support, updates, enhancements or modifications.
+# */
+
+# REQUIRED PYTHON VERSION: 3.7+
+# Supports Gluware REST API v1
+# Required Python modules:
+# aiohttp
+# Optional Python modules:
+# orjson or ujson (faster JSON decoding, see gluware_json_codec.py)
+
+# This class is the asyncio counterpart of APIClient in gluware_device_rest_api_client.py.
+# It exposes the same convenience methods with the same names, arguments and return values
+# ({"response_code": ..., "response_content": ...}), but every method is a coroutine so that
+# thousands of requests can be in flight from a single process.
+#
+# All requests share one aiohttp.ClientSession whose connector keeps connections alive and
+# reuses them between requests. The max_concurrency parameter bounds both the size of the
+# connection pool and the number of requests in flight at any one time.
+#
+# Example:
+#     async with AsyncAPIClient("https://gluware.example.com", "user", "pass", "", None) as client:
+#         resp = await client.get_devices(None)
+#         results = await client.get_devices_by_ids(["74caf003-...", "54d4d631-..."])
+#
+# In addition to the APIClient methods, the following bulk helpers gather many requests
+# concurrently and return a list of results in the same order as the input. A request that fails
+# with a connection error or a timeout, or whose 200 response body is not valid JSON, gives
+# {"response_code": None, "response_content": <error>} for that item only, as with APIClient's bulk methods:
+# get_devices_by_ids - get_device for every id in ids
+# get_organizations_by_ids - get_organization for every id in ids
+# create_devices - create_device for every payload in device_details_list
+# update_devices - update_device for every (device_id, device_details) pair
+# delete_devices - delete_device for every id in ids
+
+import asyncio
+import ssl
+
+import aiohttp
+
+import gluware_json_codec
+
+
+class AsyncAPIClient:
+
+    def __init__(self, control_url, username, password, organization_name, certificate_file,
+                 max_concurrency=100, keepalive_timeout=30):
+        # Set up the endpoint to be used by all requests: "https://<host>/api/devices/"
+        self.control_url = control_url
+        if not self.control_url.endswith('/'):
+            self.control_url = self.control_url + '/'
+        if not self.control_url.endswith('api/devices/'):
+            self.control_url = self.control_url + 'api/devices/'
+        # Used to set a default organization
+        self.organization_name = organization_name
+        # By default certificate validation is disabled. This is for demo purposes only.
+        # Production environments should always use cert validation as a best practice
+        self.certificate_file = certificate_file
+        if certificate_file is not None:
+            self.ssl = ssl.create_default_context(cafile=certificate_file)
+        else:
+            self.ssl = False
+        self.auth = aiohttp.BasicAuth(username, password)
+        # Upper bound on requests in flight and on pooled keep-alive connections
+        self.max_concurrency = max_concurrency
+        self.keepalive_timeout = keepalive_timeout
+        self.session = None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        self._open()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    def _open(self):
+        # The session and semaphore must be created inside the running event loop
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, ssl=self.ssl,
+                                             keepalive_timeout=self.keepalive_timeout)
+            self.session = aiohttp.ClientSession(auth=self.auth, connector=connector)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self.session
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    async def _request(self, method, url, json_body=None, **kwargs):
+        session = self._open()
+        if json_body is not None:
+            kwargs["data"] = gluware_json_codec.dumps(json_body)
+            kwargs["headers"] = {"Content-Type": "application/json"}
+        async with self._semaphore:
+            async with session.request(method, url, **kwargs) as r:
+                if r.status == 200:
+                    body = await r.read()
+                    return {"response_code": r.status, "response_content": gluware_json_codec.loads(body)}
+                else:
+                    return {"response_code": r.status, "response_content": await r.text()}
+
+    async def get_devices(self, query_details):
+        return await self._request("GET", self.control_url[:-1], params=query_details)
+
+    async def get_device(self, device_id):
+        return await self._request("GET", self.control_url + device_id)
+
+    async def create_device(self, device_details):
+        return await self._request("POST", self.control_url[:-1], json_body=device_details)
+
+    async def update_device(self, device_id, device_details):
+        return await self._request("PUT", self.control_url + device_id, json_body=device_details)
+
+    async def discover_devices(self, device_details):
+        return await self._request("POST", self.control_url + "discover", json_body=device_details)
+
+    async def delete_device(self, device_id):
+        return await self._request("DELETE", self.control_url + device_id)
+
+    async def get_organizations(self):
+        org_url = self.control_url[:-12] + "api/organizations"
+        return await self._request("GET", org_url)
+
+    async def get_organization(self, organization_id):
+        org_url = self.control_url[:-12] + "api/organizations"
+        return await self._request("GET", org_url + '/' + organization_id)
+
+    async def get_organization_id_by_name(self, organization_name, parent_organization_name):
+        resp = await self.get_organizations()
+        if resp["response_code"] == 200:
+            for org in resp["response_content"]:
+                if org["name"] == organization_name and org["parentName"] == parent_organization_name:
+                    return {"response_code": resp["response_code"], "response_content": org["id"]}
+            return {"response_code": 404, "response_content": "Organization Not Found"}
+        else:
+            return resp
+
+    async def _result_or_error(self, coroutine):
+        try:
+            return await coroutine
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            # ValueError: a response body that is not valid JSON
+            return {"response_code": None, "response_content": str(e) or type(e).__name__}
+
+    async def _gather(self, coroutines):
+        # One failed request must not discard the results of all the others
+        return await asyncio.gather(*(self._result_or_error(coroutine) for coroutine in coroutines))
+
+    async def get_devices_by_ids(self, ids):
+        return await self._gather(self.get_device(device_id) for device_id in ids)
+
+    async def get_organizations_by_ids(self, ids):
+        return await self._gather(self.get_organization(organization_id) for organization_id in ids)
+
+    async def create_devices(self, device_details_list):
+        return await self._gather(self.create_device(device_details) for device_details in device_details_list)
+
+    async def update_devices(self, updates):
+        return await self._gather(self.update_device(device_id, device_details)
+                                  for device_id, device_details in updates)
+
+    async def delete_devices(self, ids):
+        return await self._gather(self.delete_device(device_id) for device_id in ids)
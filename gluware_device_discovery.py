@@ -0,0 +1,293 @@
+# /* Copyright (C) 2019 Gluware - All Rights Reserved
+# * This code is provided “as is” with no implied warranties or fitness
+# * for a particular purpose. Gluware, Inc. is under no obligation to
+# * provide maintenance, support, updates, enhancements or modifications.
+# */
+
+# REQUIRED PYTHON VERSION: 3.x
+# Supports Gluware REST API v1
+# Required Python modules:
+# requests, urllib3 (through gluware_device_rest_api_client.py)
+
+# This class runs device discovery for large numbers of devices on top of APIClient.discover_devices and
+# APIClient.iter_devices, replacing the manual "Discover Device" / "Retrieve Device By ID" loop of the demo.
+#
+# Example:
+#     with DiscoveryOrchestrator(client, batch_size=50, max_in_flight=500) as orchestrator:
+#         futures = orchestrator.discover(device_ids, org_id=org_id,
+#                                         callback=lambda future: print(future.result()["name"]))
+#         for device_id, future in futures.items():
+#             try:
+#                 device = future.result()
+#             except DiscoveryError as e:
+#                 print(device_id, e.status)
+#
+# discover - Queues the given device ids for discovery and returns {device id: concurrent.futures.Future}.
+#            Devices may also be given as device dicts, whose orgId is used for polling; org_id gives the
+#            organization of devices given by id. Each future resolves with the device dict once its
+#            discoveryStatus leaves the pending states, or fails with DiscoveryError when discovery fails, times
+#            out or cannot be started. The optional callback is attached to every future with
+#            add_done_callback. Repeated ids are discovered once: an id that is already queued or being
+#            discovered gets the future of that earlier discovery.
+# wait - Blocks until every queued device has finished
+# shutdown - Stops the background thread; queued devices that have not started are failed
+#
+# A single background thread does all the work:
+# - Queued devices are sent to POST /api/devices/discover in batches of batch_size, as long as fewer than
+#   max_in_flight devices are being discovered, so the controller never has more discoveries running than that.
+# - The status of the in-flight devices is polled once per tick, batched by organization: one
+#   GET /api/devices?orgId=<org> per organization with devices in flight. A device whose organization is not
+#   known (given by id without org_id), or that its organization's listing did not return, is fetched once with
+#   GET /api/devices/{id}, which tells its organization for the following ticks. With poll_by_id=True every
+#   in-flight device is fetched with GET /api/devices/{id} on every tick instead (APIClient.bulk_get_devices),
+#   which is cheaper when the organizations hold many more devices than are being discovered. With poll_query
+#   (e.g. {"orgId": ...}) a single GET /api/devices?<poll_query> is sent per tick.
+# - The poll interval starts at min_poll_interval and is multiplied by backoff_factor, up to max_poll_interval,
+#   after every tick in which no device finished or the server returned an error. It drops back to
+#   min_poll_interval as soon as devices finish.
+# - Right after discovery is triggered a device may still report the status of its previous discovery, so a
+#   non-pending status is only accepted once the device has been seen pending or settle_time has passed.
+
+import concurrent.futures
+import threading
+import time
+
+PENDING_STATUSES = ("starting", "pending", "queued", "running", "in progress", "inprogress", "discovering")
+FAILED_STATUS_MARKERS = ("fail", "error")
+
+
+class DiscoveryError(Exception):
+
+    def __init__(self, device_id, status, device=None):
+        super().__init__("Discovery of device {} did not succeed: {}".format(device_id, status))
+        self.device_id = device_id
+        self.status = status
+        self.device = device
+
+
+class _Discovery:
+
+    def __init__(self, device_id, future, org_id=None):
+        self.device_id = device_id
+        self.future = future
+        # Organization polled for the device, or None to fetch it by id
+        self.org_id = org_id
+        self.started_at = None
+        self.seen_pending = False
+
+
+class DiscoveryOrchestrator:
+
+    def __init__(self, client, batch_size=50, max_in_flight=200, min_poll_interval=2.0, max_poll_interval=60.0,
+                 backoff_factor=2.0, settle_time=10.0, timeout=1800.0, poll_query=None, poll_by_id=False,
+                 pending_statuses=PENDING_STATUSES, failed_status_markers=FAILED_STATUS_MARKERS):
+        self.client = client
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.min_poll_interval = min_poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.backoff_factor = backoff_factor
+        self.settle_time = settle_time
+        self.timeout = timeout
+        self.poll_query = poll_query
+        self.poll_by_id = poll_by_id
+        self.pending_statuses = {status.lower() for status in pending_statuses}
+        self.failed_status_markers = tuple(marker.lower() for marker in failed_status_markers)
+        self.poll_interval = min_poll_interval
+        self._queued = []
+        self._in_flight = {}
+        # Future of every device that is queued, starting or in flight, by device id
+        self._futures = {}
+        # Devices taken off the queue whose discover request has not returned yet
+        self._starting = 0
+        # Re-entrant so that future callbacks, which run while it is held, may call discover
+        self._condition = threading.Condition(threading.RLock())
+        self._stopping = False
+        self._thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.wait()
+        self.shutdown()
+
+    def discover(self, device_ids, callback=None, org_id=None):
+        futures = {}
+        with self._condition:
+            if self._stopping:
+                raise RuntimeError("DiscoveryOrchestrator has been shut down")
+            for device in device_ids:
+                if isinstance(device, dict):
+                    device_id, device_org_id = device["id"], device.get("orgId", org_id)
+                else:
+                    device_id, device_org_id = device, org_id
+                if device_id in futures:
+                    continue
+                future = self._futures.get(device_id)
+                if future is None:
+                    future = self._futures[device_id] = concurrent.futures.Future()
+                    self._queued.append(_Discovery(device_id, future, device_org_id))
+                if callback is not None:
+                    future.add_done_callback(callback)
+                futures[device_id] = future
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="gluware-discovery", daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+        return futures
+
+    def wait(self):
+        with self._condition:
+            while self._queued or self._starting or self._in_flight:
+                self._condition.wait()
+
+    def shutdown(self, wait=True):
+        with self._condition:
+            self._stopping = True
+            queued, self._queued = self._queued, []
+            for discovery in queued:
+                self._finish(discovery, DiscoveryError(discovery.device_id, "cancelled"))
+            self._condition.notify_all()
+        if wait and self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._stopping and not self._queued and not self._in_flight:
+                    self._condition.wait()
+                if self._stopping:
+                    for discovery in list(self._in_flight.values()):
+                        self._finish(discovery, DiscoveryError(discovery.device_id, "cancelled"))
+                    self._condition.notify_all()
+                    return
+            self._start_batches()
+            with self._condition:
+                self._condition.wait(self.poll_interval)
+            self._poll()
+
+    def _start_batches(self):
+        while True:
+            with self._condition:
+                room = self.max_in_flight - len(self._in_flight)
+                if room <= 0 or not self._queued:
+                    return
+                batch = self._queued[:min(room, self.batch_size)]
+                del self._queued[:len(batch)]
+                self._starting += len(batch)
+            try:
+                resp = self.client.discover_devices({"devices": [discovery.device_id for discovery in batch]})
+            except Exception as e:
+                resp = {"response_code": None, "response_content": str(e)}
+            now = time.monotonic()
+            with self._condition:
+                self._starting -= len(batch)
+                for discovery in batch:
+                    if resp["response_code"] == 200:
+                        discovery.started_at = now
+                        self._in_flight[discovery.device_id] = discovery
+                    else:
+                        self._finish(discovery, DiscoveryError(discovery.device_id, resp["response_content"]))
+                self._condition.notify_all()
+
+    def _poll(self):
+        with self._condition:
+            if not self._in_flight:
+                return
+            tracked = dict(self._in_flight)
+        statuses = self._fetch_statuses(tracked)
+        if statuses is None:
+            # The server could not be reached or returned errors; the next tick retries
+            self._back_off()
+            return
+        now = time.monotonic()
+        finished = 0
+        with self._condition:
+            for device_id, discovery in tracked.items():
+                if self._in_flight.get(device_id) is not discovery:
+                    continue
+                device = statuses.get(device_id)
+                if device is None:
+                    # Not returned by the poll (deleted, or outside poll_query) - only the timeout applies
+                    if now - discovery.started_at >= self.timeout:
+                        self._finish(discovery, DiscoveryError(device_id, "timed out"))
+                        finished += 1
+                    continue
+                status = str(device.get("discoveryStatus", "")).lower()
+                if status in self.pending_statuses:
+                    discovery.seen_pending = True
+                    if now - discovery.started_at >= self.timeout:
+                        self._finish(discovery, DiscoveryError(device_id, "timed out", device))
+                        finished += 1
+                    continue
+                if not discovery.seen_pending and now - discovery.started_at < self.settle_time:
+                    continue
+                if any(marker in status for marker in self.failed_status_markers):
+                    self._finish(discovery, DiscoveryError(device_id, device.get("discoveryStatus"), device))
+                else:
+                    self._finish(discovery, device)
+                finished += 1
+            self._condition.notify_all()
+        if finished:
+            self.poll_interval = self.min_poll_interval
+        else:
+            self._back_off()
+
+    def _list_devices(self, query, tracked, statuses):
+        # Adds the tracked devices among those returned for query to statuses; False if the listing failed
+        try:
+            for device in self.client.iter_devices(query):
+                if device.get("id") in tracked:
+                    statuses[device["id"]] = device
+        except Exception:
+            # Covers APIClientError as well as connection errors
+            return False
+        return True
+
+    def _fetch_statuses(self, tracked):
+        # {device id: device} for the tracked ({device id: discovery}) devices the server returned, or None if
+        # polling failed. Only called from the background thread, which alone updates discovery.org_id
+        statuses = {}
+        if self.poll_query is not None:
+            return statuses if self._list_devices(self.poll_query, tracked, statuses) else None
+        by_org = {}
+        by_id = []
+        for device_id, discovery in tracked.items():
+            if discovery.org_id is None or self.poll_by_id:
+                by_id.append(device_id)
+            else:
+                by_org.setdefault(discovery.org_id, set()).add(device_id)
+        errors = 0
+        for org_id, device_ids in by_org.items():
+            if not self._list_devices({"orgId": org_id}, device_ids, statuses):
+                errors += 1
+                continue
+            for device_id in device_ids - statuses.keys():
+                # Moved to another organization or deleted; the next tick fetches it by id
+                tracked[device_id].org_id = None
+        if by_id:
+            for result in self.client.bulk_get_devices(by_id):
+                if result["response_code"] == 200:
+                    device = result["response_content"]
+                    statuses[result["item"]] = device
+                    if not self.poll_by_id:
+                        tracked[result["item"]].org_id = device.get("orgId")
+                elif result["response_code"] is None or result["response_code"] >= 500:
+                    errors += 1
+        if errors and not statuses:
+            return None
+        return statuses
+
+    def _finish(self, discovery, result):
+        # Must be called with the condition held
+        self._in_flight.pop(discovery.device_id, None)
+        del self._futures[discovery.device_id]
+        if isinstance(result, Exception):
+            discovery.future.set_exception(result)
+        else:
+            discovery.future.set_result(result)
+
+    def _back_off(self):
+        self.poll_interval = min(self.poll_interval * self.backoff_factor, self.max_poll_interval)
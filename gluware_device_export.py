@@ -0,0 +1,243 @@
+# /* Copyright (C) 2019 Gluware - All Rights Reserved
+# * This code is provided “as is” with no implied warranties or fitness
+# * for a particular purpose. Gluware, Inc. is under no obligation to
+# * provide maintenance, support, updates, enhancements or modifications.
+# */
+
+# REQUIRED PYTHON VERSION: 3.10+ (through gluware_models.py)
+# Supports Gluware REST API v1
+# Optional Python modules:
+# pyarrow (Parquet output)
+
+# Streaming export of devices to JSON lines, CSV or Parquet, e.g. for nightly inventory dumps. Devices are
+# written as they are read from APIClient.iter_devices (or any other iterable of device dicts), so memory use
+# stays constant whatever the size of the fleet; Parquet output holds one row group of batch_size devices.
+#
+# export_devices(devices, output, format="jsonl", fields=None, compression=None, batch_size=10000)
+#     Writes devices to output (a path, or a binary file object) and returns the number of devices written.
+#     format - "jsonl": one JSON object per line
+#              "csv": one row per device; nested objects are flattened into dotted columns such as
+#                     connectionInformation.ip, lists are written as JSON (gluware_cli.py reads both back)
+#              "parquet": flattened like CSV; requires pyarrow (pip install pyarrow)
+#     fields - Dotted field paths to export, e.g. ["id", "name", "connectionInformation.ip"]. By default every
+#              field is exported. For CSV and Parquet the default columns are DEVICE_COLUMNS, the fields known
+#              to gluware_models.Device (missing values are left empty), followed by any other field of the
+#              first device and by EXTRA_COLUMN ("extra"). Fields of later devices outside those columns (e.g.
+#              custom fields of some organizations) are written to the extra column as a JSON object of
+#              {dotted field: value}, so nothing is dropped and the export never stops part way through.
+#     compression - "gzip", "bz2" or "xz" for JSON lines and CSV, inferred from a .gz, .bz2 or .xz output path
+#                   when not given. For Parquet it is the Parquet codec passed to pyarrow (e.g. "snappy", "zstd").
+# export_client_devices(client, output, query_details=None, page_size=None, **options)
+#     Exports the devices returned by client.iter_devices(query_details, page_size=page_size)
+#
+# Example:
+#     export_client_devices(client, "inventory.csv.gz", format="csv",
+#                           fields=["id", "name", "orgId", "connectionInformation.ip"])
+
+import bz2
+import csv
+import gzip
+import io
+import json
+import lzma
+
+import gluware_json_codec
+import gluware_models
+
+FORMATS = ("jsonl", "csv", "parquet")
+
+_OPENERS = {"gzip": gzip.open, "bz2": bz2.open, "xz": lzma.open}
+_EXTENSIONS = {".gz": "gzip", ".bz2": "bz2", ".xz": "xz"}
+
+_MISSING = object()
+
+
+def _model_columns(model, prefix=""):
+    columns = []
+    for _, name, _ in model.FIELDS:
+        if name == "connectionInformation":
+            columns.extend(_model_columns(gluware_models.ConnectionInformation, prefix + name + "."))
+        else:
+            columns.append(prefix + name)
+    return columns
+
+
+DEVICE_COLUMNS = tuple(_model_columns(gluware_models.Device))
+# Overflow column for the fields of a device that have no column of their own
+EXTRA_COLUMN = "extra"
+
+
+def flatten_device(device, prefix="", row=None):
+    # {"connectionInformation": {"ip": "10.0.0.1"}} -> {"connectionInformation.ip": "10.0.0.1"}
+    row = {} if row is None else row
+    for key, value in device.items():
+        if isinstance(value, dict):
+            flatten_device(value, prefix + key + ".", row)
+        else:
+            row[prefix + key] = value
+    return row
+
+
+def _lookup(device, path):
+    value = device
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def project_device(device, fields):
+    # Keeps only the given dotted field paths, preserving the nesting of the device
+    projected = {}
+    for path in fields:
+        value = _lookup(device, path)
+        if value is _MISSING:
+            continue
+        target = projected
+        parts = path.split(".")
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = value
+    return projected
+
+
+def _scalar(value):
+    if isinstance(value, (list, dict)):
+        return json.dumps(value)
+    return value
+
+
+def _default_columns(row=None):
+    columns = list(DEVICE_COLUMNS) + [name for name in row or () if name not in DEVICE_COLUMNS]
+    if EXTRA_COLUMN not in columns:
+        columns.append(EXTRA_COLUMN)
+    return columns
+
+
+def _spill_fields(row, column_set):
+    # Moves the fields that have no column into the extra column
+    extra = {name: row.pop(name) for name in list(row) if name not in column_set}
+    if extra:
+        row[EXTRA_COLUMN] = extra
+    return row
+
+
+def _open_output(output, compression):
+    # Returns (binary stream, whether it must be closed here)
+    if compression is None and isinstance(output, str):
+        for extension, name in _EXTENSIONS.items():
+            if output.endswith(extension):
+                compression = name
+    if compression is not None and compression not in _OPENERS:
+        raise ValueError("Unsupported compression: {}".format(compression))
+    if compression is not None:
+        return _OPENERS[compression](output, "wb"), True
+    if isinstance(output, str):
+        return open(output, "wb"), True
+    return output, False
+
+
+def _write_jsonl(devices, stream, fields):
+    count = 0
+    for device in devices:
+        if fields is not None:
+            device = project_device(device, fields)
+        stream.write(gluware_json_codec.dumps(device))
+        stream.write(b"\n")
+        count += 1
+    return count
+
+
+def _write_csv(devices, stream, fields):
+    text = io.TextIOWrapper(stream, encoding="utf-8", newline="", write_through=True)
+    try:
+        writer = None
+        column_set = None
+        count = 0
+        for device in devices:
+            row = flatten_device(device)
+            if writer is None:
+                columns = list(fields) if fields is not None else _default_columns(row)
+                column_set = None if fields is not None else set(columns)
+                writer = csv.DictWriter(text, fieldnames=columns, extrasaction="ignore")
+                writer.writeheader()
+            if column_set is not None:
+                _spill_fields(row, column_set)
+            writer.writerow({key: _scalar(value) for key, value in row.items()})
+            count += 1
+        if writer is None:
+            csv.writer(text).writerow(fields if fields is not None else _default_columns())
+        return count
+    finally:
+        # The caller owns the underlying stream
+        text.detach()
+
+
+def _write_parquet(devices, output, fields, compression, batch_size):
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Parquet export requires pyarrow (pip install pyarrow)")
+    writer = None
+    columns = list(fields) if fields is not None else None
+    column_set = None
+    count = 0
+
+    def write_batch(rows):
+        nonlocal writer
+        if writer is None:
+            inferred = pyarrow.Table.from_pylist(rows).schema if rows else None
+            types = {}
+            for name in columns:
+                # Columns that are empty in the first batch are typed as strings rather than as nulls
+                type_ = inferred.field(name).type if inferred is not None else pyarrow.null()
+                types[name] = pyarrow.string() if type_ == pyarrow.null() else type_
+            schema = pyarrow.schema([pyarrow.field(name, types[name]) for name in columns])
+            writer = pyarrow.parquet.ParquetWriter(output, schema, compression=compression or "snappy")
+        writer.write_table(pyarrow.Table.from_pylist(rows, schema=writer.schema))
+
+    try:
+        rows = []
+        for device in devices:
+            row = flatten_device(device)
+            if columns is None:
+                columns = _default_columns(row)
+                column_set = set(columns)
+            if column_set is not None:
+                _spill_fields(row, column_set)
+            rows.append({name: _scalar(row.get(name)) for name in columns})
+            count += 1
+            if len(rows) >= batch_size:
+                write_batch(rows)
+                rows = []
+        if rows or writer is None:
+            if columns is None:
+                columns = _default_columns()
+            write_batch(rows)
+    finally:
+        if writer is not None:
+            writer.close()
+    return count
+
+
+def export_devices(devices, output, format="jsonl", fields=None, compression=None, batch_size=10000):
+    if format not in FORMATS:
+        raise ValueError("Unsupported format: {}".format(format))
+    if format == "parquet":
+        return _write_parquet(devices, output, fields, compression, batch_size)
+    stream, owned = _open_output(output, compression)
+    try:
+        if format == "csv":
+            return _write_csv(devices, stream, fields)
+        return _write_jsonl(devices, stream, fields)
+    finally:
+        if owned:
+            stream.close()
+        else:
+            stream.flush()
+
+
+def export_client_devices(client, output, query_details=None, page_size=None, **options):
+    return export_devices(client.iter_devices(query_details, page_size=page_size), output, **options)
@@ -0,0 +1,184 @@
+# /* Copyright (C) 2019 Gluware - All Rights Reserved
+# * This code is provided “as is” with no implied warranties or fitness
+# * for a particular purpose. Gluware, Inc. is under no obligation to
+# * provide maintenance, support, updates, enhancements or modifications.
+# */
+
+# REQUIRED PYTHON VERSION: 3.x
+# Supports Gluware REST API v1
+# Required Python modules:
+# requests, urllib3 (through gluware_device_rest_api_client.py)
+
+# This class keeps a local snapshot of the device inventory in an SQLite database so that reporting
+# scripts can answer questions about devices without downloading the full inventory again.
+#
+# Example:
+#     inventory = DeviceInventory(client, "inventory.db")
+#     inventory.sync()                                   # first run: full snapshot
+#     inventory.sync()                                   # later runs: only changed devices are written
+#     for device in inventory.devices_in_org("565a65db-54e7-4461-a954-f0f38f310e19"):
+#         ...
+#     failed = list(inventory.devices_with_discovery_status("failed"))
+#
+# sync - Streams the device list from the client (APIClient.iter_devices) and writes only the devices that
+#        were added or changed since the last sync. A device has changed when its modified_field value differs
+#        (if a modified_field was given and the device has it) or when the hash of its content differs.
+#        A full sync (query_details of None) also removes devices that no longer exist on the server.
+#        If the server supports filtering by modification time, pass its query parameter name as since_param
+#        and only devices modified since the previous sync are requested; deletions are not detected then.
+#        The time of the previous sync is kept per query_details, so a filtered sync never makes a later sync
+#        of other devices skip their changes; a filtered sync also counts from the last full sync when that is
+#        more recent. Nothing is written if the sync fails part way through.
+#        Returns counts of added, updated, unchanged and removed devices.
+# get - Returns a single device by id, or None
+# devices_in_org - Yields the devices with the given orgId
+# devices_with_discovery_status - Yields the devices with the given discoveryStatus
+# find - Yields the devices matching all of the given indexed column values (id, org_id, name, discovery_status)
+# count - Number of devices in the snapshot
+# last_sync - Time (ISO 8601, UTC) of the last completed full sync, or of the last sync with the given
+#             query_details, or None
+
+import datetime
+import hashlib
+import json
+import sqlite3
+import time
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS devices (
+    id TEXT PRIMARY KEY,
+    org_id TEXT,
+    name TEXT,
+    discovery_status TEXT,
+    modified TEXT,
+    content_hash TEXT NOT NULL,
+    body TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS devices_org_id ON devices (org_id);
+CREATE INDEX IF NOT EXISTS devices_name ON devices (name);
+CREATE INDEX IF NOT EXISTS devices_discovery_status ON devices (discovery_status);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_INDEXED_COLUMNS = ("id", "org_id", "name", "discovery_status")
+
+
+class DeviceInventory:
+
+    def __init__(self, client, path, modified_field=None, since_param=None, batch_size=1000):
+        self.client = client
+        self.path = path
+        self.modified_field = modified_field
+        self.since_param = since_param
+        self.batch_size = batch_size
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(_SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def sync(self, query_details=None):
+        start = time.perf_counter()
+        started_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        params = dict(query_details or {})
+        previous_sync = self.last_sync(query_details)
+        if query_details:
+            previous_sync = max(filter(None, (previous_sync, self.last_sync())), default=None)
+        incremental = self.since_param is not None and previous_sync is not None
+        if incremental:
+            params[self.since_param] = previous_sync
+        # Only the change keys of known devices are held in memory, never the device bodies
+        known = {row[0]: (row[1], row[2]) for row in
+                 self.connection.execute("SELECT id, modified, content_hash FROM devices")}
+        try:
+            counts = self._sync_devices(params, known, not query_details and not incremental)
+        except BaseException:
+            # The writes of a sync that did not complete are not kept
+            self.connection.rollback()
+            raise
+        self.connection.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)",
+                                (self._sync_key(query_details), started_at))
+        self.connection.commit()
+        counts["elapsed_seconds"] = time.perf_counter() - start
+        return counts
+
+    def _sync_devices(self, params, known, remove_missing):
+        seen = set()
+        counts = {"added": 0, "updated": 0, "unchanged": 0, "removed": 0}
+        batch = []
+        for device in self.client.iter_devices(params or None):
+            device_id = device["id"]
+            seen.add(device_id)
+            body = json.dumps(device, sort_keys=True, separators=(",", ":"))
+            content_hash = hashlib.sha1(body.encode("utf-8")).hexdigest()
+            modified = device.get(self.modified_field) if self.modified_field else None
+            if device_id in known:
+                known_modified, known_hash = known[device_id]
+                if modified is not None and known_modified is not None:
+                    changed = str(modified) != known_modified
+                else:
+                    changed = content_hash != known_hash
+                if not changed:
+                    counts["unchanged"] += 1
+                    continue
+                counts["updated"] += 1
+            else:
+                counts["added"] += 1
+            batch.append((device_id, device.get("orgId"), device.get("name"), device.get("discoveryStatus"),
+                          None if modified is None else str(modified), content_hash, body))
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+        self._write(batch)
+        if remove_missing:
+            removed = [(device_id,) for device_id in known if device_id not in seen]
+            self.connection.executemany("DELETE FROM devices WHERE id = ?", removed)
+            counts["removed"] = len(removed)
+        return counts
+
+    def _write(self, batch):
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO devices (id, org_id, name, discovery_status, modified, content_hash, body) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+
+    @staticmethod
+    def _sync_key(query_details):
+        if not query_details:
+            return "last_sync"
+        return "last_sync " + json.dumps(query_details, sort_keys=True, separators=(",", ":"))
+
+    def last_sync(self, query_details=None):
+        row = self.connection.execute("SELECT value FROM sync_state WHERE key = ?",
+                                      (self._sync_key(query_details),)).fetchone()
+        return row[0] if row else None
+
+    def count(self):
+        return self.connection.execute("SELECT COUNT(*) FROM devices").fetchone()[0]
+
+    def get(self, device_id):
+        row = self.connection.execute("SELECT body FROM devices WHERE id = ?", (device_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def find(self, **filters):
+        for column in filters:
+            if column not in _INDEXED_COLUMNS:
+                raise ValueError("Cannot filter on {}, indexed columns are {}".format(column, _INDEXED_COLUMNS))
+        where = " AND ".join("{} = ?".format(column) for column in filters)
+        sql = "SELECT body FROM devices" + (" WHERE " + where if where else "")
+        for row in self.connection.execute(sql, tuple(filters.values())):
+            yield json.loads(row[0])
+
+    def devices_in_org(self, org_id):
+        return self.find(org_id=org_id)
+
+    def devices_with_discovery_status(self, discovery_status):
+        return self.find(discovery_status=discovery_status)
@@ -0,0 +1,215 @@
+# /* Copyright (C) 2019 Gluware - All Rights Reserved
+# * This code is provided “as is” with no implied warranties or fitness
+# * for a particular purpose. Gluware, Inc. is under no obligation to
+# * provide maintenance, support, updates, enhancements or modifications.
+# */
+
+# REQUIRED PYTHON VERSION: 3.x
+# Supports Gluware REST API v1
+
+# Small query engine over device results: filtering with predicates on (nested) device fields, projection
+# and group-by counts, all evaluated in a single streaming pass over APIClient.iter_devices, so that fleet
+# reports never hold or copy the whole device list.
+#
+# Predicates are built from Field objects, with dotted paths for nested fields, and combined with & (and),
+# | (or) and ~ (not):
+#     Field("discoveryStatus") == "success"
+#     Field("connectionInformation.port") != "22"
+#     Field("connectionInformation.ip").matches(r"^10\.1\.")       regular expression search
+#     Field("orgId").isin([org_a, org_b])
+#     Field("name").between("core-a", "core-m")                     inclusive; also <, <=, >, >=
+#     Field("description").exists()
+# A comparison with a missing field, or with a value of another type, is false.
+#
+# Equality predicates on top-level fields that must all hold (joined only by &) are pushed down to the server
+# as get_devices query parameters, so fewer devices are transferred. They are still checked locally, so the
+# results are the same whether or not the server applies them. pushdown_fields lists the fields pushed down,
+# by default only PUSHDOWN_FIELDS (orgId), which the server is known to filter on; None pushes down any
+# top-level field and () none. Pushed-down values are added to the caller's query_details; a query_details
+# value for the same field that differs raises ValueError instead of being replaced.
+#
+# DeviceQuery(where=None, select=None, pushdown_fields=PUSHDOWN_FIELDS)
+#     server_query() - The query parameters that would be sent to get_devices
+#     evaluate(devices) - Filters and projects any iterable of device dicts
+#     run(client, query_details=None, page_size=None) - Streams the matching (projected) devices
+#     count(client, ...) - Number of matching devices
+#     count_by(client, *fields, ...) - {value: count} of the matching devices grouped by one field, or
+#                                      {(value, value, ...): count} for several fields
+#
+# Example:
+#     query = DeviceQuery(where=(Field("orgId") == org_id) & ~(Field("discoveryStatus") == "success"),
+#                         select=["id", "name", "connectionInformation.ip"])
+#     for device in query.run(client):
+#         ...
+#     DeviceQuery().count_by(client, "orgId", "discoveryStatus")
+
+import re
+
+import gluware_device_export
+
+PUSHDOWN_FIELDS = ("orgId",)
+
+_MISSING = object()
+
+
+def field_value(device, path, default=None):
+    value = device
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return default
+        value = value[part]
+    return value
+
+
+class Predicate:
+
+    def __init__(self, test, description, pushdown=None):
+        self.test = test
+        self.description = description
+        # {field: value} equalities that every matching device satisfies, or None
+        self.pushdown = pushdown
+
+    def __call__(self, device):
+        return self.test(device)
+
+    def __and__(self, other):
+        pushdown = None
+        if self.pushdown is not None or other.pushdown is not None:
+            pushdown = dict(self.pushdown or {})
+            for name, value in (other.pushdown or {}).items():
+                if name in pushdown and pushdown[name] != value:
+                    # Contradictory equalities: nothing matches, which the local check will find
+                    pushdown = None
+                    break
+                pushdown[name] = value
+        return Predicate(lambda device: self.test(device) and other.test(device),
+                         "({} & {})".format(self.description, other.description), pushdown)
+
+    def __or__(self, other):
+        return Predicate(lambda device: self.test(device) or other.test(device),
+                         "({} | {})".format(self.description, other.description))
+
+    def __invert__(self):
+        return Predicate(lambda device: not self.test(device), "~({})".format(self.description))
+
+    def __repr__(self):
+        return "Predicate({})".format(self.description)
+
+
+class Field:
+
+    def __init__(self, path):
+        self.path = path
+
+    def _compare(self, operator, description, value):
+        # operator(current) tests the current value of the field; value is only used to describe the predicate
+        path = self.path
+
+        def test(device):
+            current = field_value(device, path, _MISSING)
+            if current is _MISSING:
+                return False
+            try:
+                return operator(current)
+            except TypeError:
+                return False
+        return Predicate(test, "{} {} {!r}".format(path, description, value))
+
+    def __eq__(self, value):
+        predicate = self._compare(lambda current: current == value, "==", value)
+        # Only strings are pushed down: query parameters are strings, and the server's matching of other types
+        # against their string form is not something to rely on
+        if "." not in self.path and isinstance(value, str):
+            predicate.pushdown = {self.path: value}
+        return predicate
+
+    def __ne__(self, value):
+        return self._compare(lambda current: current != value, "!=", value)
+
+    def __lt__(self, value):
+        return self._compare(lambda current: current < value, "<", value)
+
+    def __le__(self, value):
+        return self._compare(lambda current: current <= value, "<=", value)
+
+    def __gt__(self, value):
+        return self._compare(lambda current: current > value, ">", value)
+
+    def __ge__(self, value):
+        return self._compare(lambda current: current >= value, ">=", value)
+
+    __hash__ = None
+
+    def between(self, low, high):
+        return self._compare(lambda current: low <= current <= high, "between", (low, high))
+
+    def isin(self, values):
+        values = frozenset(values)
+        return self._compare(lambda current: current in values, "in", sorted(values, key=repr))
+
+    def matches(self, pattern, flags=0):
+        compiled = re.compile(pattern, flags)
+        return self._compare(lambda current: isinstance(current, str) and compiled.search(current) is not None,
+                             "matches", compiled.pattern)
+
+    def exists(self):
+        path = self.path
+        return Predicate(lambda device: field_value(device, path, _MISSING) is not _MISSING,
+                         "{} exists".format(path))
+
+    def __repr__(self):
+        return "Field({!r})".format(self.path)
+
+
+class DeviceQuery:
+
+    def __init__(self, where=None, select=None, pushdown_fields=PUSHDOWN_FIELDS):
+        self.where = where
+        self.select = list(select) if select is not None else None
+        self.pushdown_fields = pushdown_fields
+
+    def server_query(self):
+        pushdown = self.where.pushdown if self.where is not None else None
+        if not pushdown:
+            return {}
+        if self.pushdown_fields is None:
+            return dict(pushdown)
+        return {name: value for name, value in pushdown.items() if name in self.pushdown_fields}
+
+    def _matching(self, devices):
+        if self.where is None:
+            return iter(devices)
+        return filter(self.where.test, devices)
+
+    def evaluate(self, devices):
+        matching = self._matching(devices)
+        if self.select is None:
+            return matching
+        return (gluware_device_export.project_device(device, self.select) for device in matching)
+
+    def _source(self, client, query_details, page_size):
+        params = dict(query_details or {})
+        for name, value in self.server_query().items():
+            if name in params and params[name] != value:
+                raise ValueError("query_details {}={!r} conflicts with the query's {}={!r}".format(
+                    name, params[name], name, value))
+            params[name] = value
+        return client.iter_devices(params or None, page_size=page_size)
+
+    def run(self, client, query_details=None, page_size=None):
+        return self.evaluate(self._source(client, query_details, page_size))
+
+    def count(self, client, query_details=None, page_size=None):
+        return sum(1 for _ in self._matching(self._source(client, query_details, page_size)))
+
+    def count_by(self, client, *fields, query_details=None, page_size=None):
+        if not fields:
+            raise ValueError("count_by requires at least one field")
+        counts = {}
+        for device in self._matching(self._source(client, query_details, page_size)):
+            if len(fields) == 1:
+                key = field_value(device, fields[0])
+            else:
+                key = tuple(field_value(device, path) for path in fields)
+            counts[key] = counts.get(key, 0) + 1
+        return counts
@@ -8,6 +8,8 @@
 # Supports Gluware REST API v1
 # Required Python modules:
 # requests, urllib3
+# Optional Python modules:
+# orjson or ujson (faster JSON decoding, see gluware_json_codec.py)
 
 # This class provides convenience methods for the Gluware Device REST API
 # The requests and urllib3 modules are used to simplify communication with the HTTP server,
@@ -23,6 +25,13 @@
 #               key/value pairs for device attributes. To get all devices pass None as the payload value.
 #               Example query detail value: '{"orgId": "565a65db-54e7-4461-a954-f0f38f310e19"}'
 #               GET https://<Gluware host>/api/devices?<key/value pairs from query details>
+# iter_devices - Generator version of get_devices that yields one device dict at a time. When page_size is given,
+#                devices are requested page by page (page_size_param/page_offset_param, "limit" and "offset"
+#                by default) until a short page is returned. Otherwise the single JSON array returned by
+#                GET /api/devices is parsed incrementally as it streams in. Either way memory use does not
+#                grow with the number of devices. Raises APIClientError if the server returns an error, or if
+#                it ignores the paging parameters (a page longer than page_size, or a page with no device that
+#                was not already in the previous page), rather than requesting the same devices forever.
 # get_device - Returns a single device matching the device_id parameter value
 #              GET https://<Gluware host>/api/devices/74caf003-0b1d-4c03-a166-1dce207b3ad5
 # create_device - Creates a new device with details passed in device_details parameter. Required parameters are
@@ -58,14 +67,492 @@
 #                               organization matching both the parent name and the org name
 #                               GET GET https://<Gluware host>/api/organizations, but with response parsing
 #                               to drop all non-matching orgs
+#                               The organization list is held in the client's organization cache (see below),
+#                               so repeated lookups are answered from memory
+# get_organization_by_path - Retrieves an organization by its full path, such as GluwareSystemOrganization/Lab/US
+#                            Returns response code 409 rather than 404 when the path names an organization
+#                            whose place in the hierarchy cannot be determined (see ORGANIZATION CACHE)
+#
+# ORGANIZATION CACHE
+# get_organization, get_organization_id_by_name and get_organization_by_path are answered from an in-memory
+# copy of the organization list (client.organization_cache) indexed by id, by (name, parentName) and by full
+# path. The list is downloaded again only when a lookup misses or the copy is older than
+# organization_cache_ttl seconds (300 by default, 0 disables the cache). get_organization loads the list on a
+# cold or expired lookup like the others; an id that is missing from a fresh copy is fetched with a direct GET
+# of that organization rather than a full reload, and kept in the cache.
+# client.organization_cache.invalidate() drops the cached copy, and its hits and misses attributes count
+# lookups answered from memory and from the server respectively.
+# Full paths are built from parentId when the organization list carries it, otherwise from parentName. When
+# several organizations share the parentName of an organization (e.g. a child of "US" when both
+# GluwareSystemOrganization/Lab/US and GluwareSystemOrganization/Production/US exist), the organization is
+# fetched on its own with resolve_organization_parent in case that response carries its parentId. Organizations
+# whose parent still cannot be determined, and the organizations below them, have no path; they are listed in
+# client.organization_cache.unresolved.
+#
+# RESILIENCE
+# enable_resilience - Replaces the session's pooled HTTPAdapter with a ResilientHTTPAdapter (see
+#                     gluware_rest_api_resilience.py) that adds a client-side token-bucket rate limit, retries with
+#                     exponential back-off and jitter honoring Retry-After for idempotent requests, and a circuit
+#                     breaker that fails fast while Gluware Control is unhealthy. Keyword arguments are passed to
+#                     ResilientHTTPAdapter, e.g. client.enable_resilience(rate=50, burst=100, max_retries=5)
+#
+# HTTP CACHE
+# enable_cache - Turns on the opt-in HTTP response cache (see gluware_rest_api_cache.py) for the read endpoints.
+#                GET responses carrying an ETag or Last-Modified header are stored in memory (LRU) or, with
+#                store=DiskCacheStore(directory), on disk, and later requests for the same URL are revalidated with
+#                If-None-Match / If-Modified-Since so that unchanged resources cost a 304 instead of a full body.
+#                create_device, update_device, delete_device and discover_devices invalidate the cached device
+#                responses. Returns the CachingAdapter, whose hits, revalidations and misses count cache use.
+#
+# INSTRUMENTATION
+# The client's session is an InstrumentedSession (see gluware_rest_api_metrics.py) that reports every request,
+# with its endpoint template (e.g. "GET /api/devices/{id}"), status, latency, bytes transferred and retry count,
+# to the observers registered on it.
+# add_request_observer - Registers a callable that is called with the record of every request
+# enable_metrics - Registers and returns a RequestMetrics observer that keeps per-endpoint latency histograms and
+#                  p50/p95/p99 latencies, exportable with to_prometheus() or to_json(). Its workflow(name) context
+#                  manager times a whole block of calls
+#
+# RESPONSES
+# All methods return a response in the form {"response_code": ..., "response_content": ...}. For the methods
+# that call the REST API directly this is an APIResponse, a mapping that only decodes the body when
+# "response_content" is first read: callers that only check "response_code" never pay for JSON decoding.
+# As before, response_content is the decoded JSON for a 200 response and the response text otherwise.
+# APIResponse.raw_content holds the undecoded body bytes, and APIResponse.save(file) writes them to a path or
+# binary file object, so bodies can be passed on to disk or another service without being decoded. Once
+# response_content has been read the body bytes are released, so that a large device list is not held both
+# raw and decoded; raw_content and save() then encode the decoded content again, which gives equivalent but
+# not necessarily byte-identical JSON. Use them before reading response_content to get the body as sent.
+# JSON is decoded and encoded with the fastest installed codec (orjson, ujson or the standard library json
+# module, see gluware_json_codec.py).
+#
+# BULK DEVICE OPERATIONS
+# The bulk methods fan a single device operation out over a pool of worker threads sized to the
+# session's connection pool (pool_maxsize), so that every worker can hold its own keep-alive connection.
+# Each returns a BulkResults object. Iterating over it yields one result per item as soon as that item
+# completes (not in input order), in the same {"response_code", "response_content"} shape as the
+# single-device methods plus "index" (position of the item in the input) and "item" (the input itself).
+# Once iteration has finished, summary() reports the totals, failures and throughput of the run.
+# Example:
+#     results = client.bulk_create_devices(payloads)
+#     for result in results:
+#         print(result["index"], result["response_code"])
+#     print(results.summary())
+# bulk_get_devices - Calls get_device for every device id in the device_ids iterable
+# bulk_create_devices - Calls create_device for every payload in the device_details iterable
+# bulk_update_devices - Calls update_device for every (device_id, device_details) pair in the updates iterable
+# bulk_delete_devices - Calls delete_device for every device id in the device_ids iterable
+#
+# RECONCILIATION
+# reconcile_devices - Brings devices to a desired state while sending as little as possible. desired_states is an
+#                     iterable of device dicts that each include the device "id" and the fields that should be
+#                     set. The current state of all devices is fetched in one streamed GET /api/devices
+#                     (narrowed with query_details, or with fetch_by_id=True one GET per desired device over the
+#                     bulk worker pool), and every desired field is compared with the current value, down to the
+#                     fields nested in objects such as connectionInformation. Scalars are compared by their
+#                     string form so that e.g. port 22 and "22" are equal. Devices without differences get no
+#                     request at all; the others get a PUT containing only the top-level fields that differ (a
+#                     nested object that differs is sent as given in the desired state, so nothing the caller
+#                     specified is dropped). Fields listed in ignore_fields (dotted paths, e.g.
+#                     "connectionInformation.password" for write-only fields that are never returned) are not
+#                     compared. With dry_run=True nothing is sent.
+#                     Returns a summary: counts of total, unchanged, changed, missing (not found on the server),
+#                     updated and failed devices, the field-level "diffs" per device id as
+#                     [{"field", "current", "desired"}], and the failures. With fetch_by_id a device whose GET
+#                     fails with anything but 404 is counted as failed (its failure has the device id as item),
+#                     not as missing; the failed updates have (device id, fields) items.
+
+import collections.abc
+import concurrent.futures
+import json
+import threading
+import time
 
 import requests
 import urllib3
 
+import gluware_json_codec
+import gluware_rest_api_cache
+import gluware_rest_api_metrics
+import gluware_rest_api_resilience
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+class APIClientError(Exception):
+
+    def __init__(self, response_code, response_content):
+        super().__init__("{}: {}".format(response_code, response_content))
+        self.response_code = response_code
+        self.response_content = response_content
+
+
+class APIResponse(collections.abc.MutableMapping):
+
+    def __init__(self, response):
+        self.response = response
+        self.response_code = response.status_code
+        self._fields = {"response_code": response.status_code}
+        self._body_released = False
+
+    @property
+    def raw_content(self):
+        if not self._body_released:
+            return self.response.content
+        # The body bytes were released when they were decoded; encode the decoded content again
+        content = self._fields["response_content"]
+        if self.response_code == 200:
+            return gluware_json_codec.dumps(content)
+        return content.encode(self.response.encoding or "utf-8")
+
+    def __getitem__(self, key):
+        if key == "response_content" and key not in self._fields:
+            if self.response_code == 200:
+                self._fields[key] = gluware_json_codec.loads(self.response.content)
+            else:
+                self._fields[key] = self.response.text
+            # Only the decoded content is kept, so that a large body is not held twice
+            self.response._content = None
+            self._body_released = True
+        return self._fields[key]
+
+    def __setitem__(self, key, value):
+        self._fields[key] = value
+
+    def __delitem__(self, key):
+        del self._fields[key]
+
+    def __iter__(self):
+        yield "response_code"
+        yield "response_content"
+        for key in self._fields:
+            if key not in ("response_code", "response_content"):
+                yield key
+
+    def __len__(self):
+        return len(self._fields) + (0 if "response_content" in self._fields else 1)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+    def save(self, file):
+        if hasattr(file, "write"):
+            file.write(self.raw_content)
+        else:
+            with open(file, "wb") as f:
+                f.write(self.raw_content)
+
+
+def iter_json_array(chunks):
+    # Incrementally parses a JSON array from an iterable of text chunks, yielding each element as soon
+    # as it is complete. Only the unparsed tail of the stream is held in memory.
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    started = False
+    chunks = iter(chunks)
+    while True:
+        # Skip whitespace and separators between elements
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position < len(buffer):
+                break
+            chunk = next(chunks, None)
+            if chunk is None:
+                if started:
+                    raise ValueError("Unterminated JSON array")
+                return
+            buffer = chunk
+            position = 0
+        if not started:
+            if buffer[position] != "[":
+                raise ValueError("Expected a JSON array")
+            started = True
+            position += 1
+            continue
+        if buffer[position] == "]":
+            return
+        while True:
+            try:
+                element, end = decoder.raw_decode(buffer, position)
+            except ValueError:
+                # The element is not complete yet; read more of the stream
+                chunk = next(chunks, None)
+                if chunk is None:
+                    raise
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+            # A number that ends at the end of the buffer, or right before a ".", "e" or "E" that the decoder
+            # could not use yet (as in "1." or "1e"), may still be continued by the next chunk
+            if not isinstance(element, (dict, list, str)) and (end == len(buffer) or buffer[end] in ".eE"):
+                chunk = next(chunks, None)
+                if chunk is not None:
+                    buffer = buffer[position:] + chunk
+                    position = 0
+                    continue
+            break
+        yield element
+        position = end
+
+
+def _values_equal(current, desired):
+    if current == desired:
+        return True
+    scalars = (str, int, float)
+    return (isinstance(current, scalars) and isinstance(desired, scalars) and not isinstance(current, bool)
+            and not isinstance(desired, bool) and str(current) == str(desired))
+
+
+def diff_device(current, desired, ignore_fields=(), prefix=""):
+    # Returns [{"field": dotted path, "current": value, "desired": value}] for every field of desired whose
+    # value differs from current, descending into nested objects
+    changes = []
+    for key, desired_value in desired.items():
+        field = prefix + key
+        if field in ignore_fields or (not prefix and key == "id"):
+            continue
+        current_value = current.get(key) if isinstance(current, dict) else None
+        if isinstance(desired_value, dict) and isinstance(current_value, dict):
+            changes.extend(diff_device(current_value, desired_value, ignore_fields, field + "."))
+        elif not _values_equal(current_value, desired_value):
+            changes.append({"field": field, "current": current_value, "desired": desired_value})
+    return changes
+
+
+class BulkResults:
+
+    def __init__(self, operation, call, items, max_workers):
+        self.operation = operation
+        self.max_workers = max_workers
+        self._call = call
+        self._items = items
+        self._consumed = False
+        self.total = 0
+        self.succeeded = 0
+        self.failures = []
+        self.elapsed_seconds = 0.0
+
+    def __iter__(self):
+        if self._consumed:
+            raise RuntimeError("BulkResults can only be iterated once")
+        self._consumed = True
+        start = time.perf_counter()
+        items = enumerate(self._items)
+        pending = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            try:
+                # Keep a bounded number of items queued so that arbitrarily large (or lazy) inputs
+                # are never materialized in full
+                for index, item in items:
+                    pending[executor.submit(self._call, item)] = (index, item)
+                    if len(pending) >= self.max_workers * 2:
+                        break
+                while pending:
+                    done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        index, item = pending.pop(future)
+                        yield self._record(index, item, future)
+                        next_item = next(items, None)
+                        if next_item is not None:
+                            pending[executor.submit(self._call, next_item[1])] = next_item
+            finally:
+                for future in pending:
+                    future.cancel()
+                self.elapsed_seconds = time.perf_counter() - start
+
+    def _record(self, index, item, future):
+        try:
+            result = future.result()
+        except requests.exceptions.RequestException as e:
+            result = {"response_code": None, "response_content": str(e)}
+        result["index"] = index
+        result["item"] = item
+        self.total += 1
+        if result["response_code"] == 200:
+            self.succeeded += 1
+        else:
+            self.failures.append({"index": index, "item": item, "response_code": result["response_code"],
+                                  "response_content": result["response_content"]})
+        return result
+
+    def wait(self):
+        # Runs the whole operation without streaming the individual results
+        for _ in self:
+            pass
+        return self.summary()
+
+    def summary(self):
+        return {"operation": self.operation,
+                "total": self.total,
+                "succeeded": self.succeeded,
+                "failed": len(self.failures),
+                "elapsed_seconds": self.elapsed_seconds,
+                "items_per_second": self.total / self.elapsed_seconds if self.elapsed_seconds else 0.0,
+                "failures": self.failures}
+
+
+def organization_paths(organizations, resolve_parent=None, unresolved=None):
+    # Returns {organization id: full path} for a flat organization list, e.g.
+    # "GluwareSystemOrganization/Lab/US". Parents are resolved by parentId when the API provides it,
+    # otherwise by parentName when that name is unique on the system, otherwise by
+    # resolve_parent(org, candidate parents), which returns one of the candidates or None. Organizations
+    # whose ancestry cannot be resolved unambiguously are left out, and appended to the unresolved list
+    # when one is given.
+    by_id = {org["id"]: org for org in organizations}
+    by_name = {}
+    for org in organizations:
+        by_name.setdefault(org["name"], []).append(org)
+    paths = {}
+
+    def parent_of(org):
+        if org.get("parentId") in by_id:
+            return by_id[org["parentId"]]
+        candidates = [candidate for candidate in by_name.get(org.get("parentName"), []) if candidate is not org]
+        if len(candidates) == 1:
+            return candidates[0]
+        if len(candidates) > 1 and resolve_parent is not None:
+            return resolve_parent(org, candidates)
+        return None
+
+    for org in organizations:
+        chain = []
+        seen = set()
+        node = org
+        while node is not None and node["id"] not in paths and node["id"] not in seen:
+            seen.add(node["id"])
+            chain.append(node)
+            node = parent_of(node)
+        if node is None:
+            # Walked up to the top: a root has no parentName, anything else has an unresolvable parent
+            prefix = "" if not chain[-1].get("parentName") else None
+        else:
+            # Reached an ancestor that was already resolved (or found to be unresolvable), or a cycle
+            prefix = paths.get(node["id"])
+        for node in reversed(chain):
+            if prefix is not None:
+                prefix = node["name"] if prefix == "" else prefix + "/" + node["name"]
+            paths[node["id"]] = prefix
+    if unresolved is not None:
+        unresolved.extend(org for org in organizations if paths.get(org["id"]) is None)
+    return {org_id: path for org_id, path in paths.items() if path is not None}
+
+
+class OrganizationCache:
+
+    def __init__(self, client, ttl):
+        self.client = client
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self._by_id = {}
+        self._by_name = {}
+        self._by_path = {}
+        # Organizations whose full path could not be determined
+        self.unresolved = []
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+            self._by_id = {}
+            self._by_name = {}
+            self._by_path = {}
+            self.unresolved = []
+
+    def _expired(self):
+        return self._loaded_at is None or time.monotonic() - self._loaded_at >= self.ttl
+
+    def _load(self):
+        # Must be called with the lock held. Returns the error response if the download failed
+        resp = self.client.get_organizations()
+        if resp["response_code"] != 200:
+            return resp
+        organizations = resp["response_content"]
+        unresolved = []
+        paths = organization_paths(organizations, self.client.resolve_organization_parent, unresolved)
+        self._by_id = {org["id"]: org for org in organizations}
+        # The first match wins when two organizations share both names, as with a linear scan
+        self._by_name = {}
+        for org in organizations:
+            self._by_name.setdefault((org["name"], org.get("parentName")), org)
+        self._by_path = {path: self._by_id[org_id] for org_id, path in paths.items()}
+        self.unresolved = unresolved
+        self._loaded_at = time.monotonic()
+        return None
+
+    def _lookup(self, index_name, key):
+        # Returns (organization, error response). A miss on a fresh copy reloads it once
+        with self._lock:
+            reloaded = False
+            if self._expired():
+                error = self._load()
+                if error is not None:
+                    return None, error
+                reloaded = True
+            org = getattr(self, index_name).get(key)
+            if org is None and not reloaded:
+                error = self._load()
+                if error is not None:
+                    return None, error
+                reloaded = True
+                org = getattr(self, index_name).get(key)
+            if reloaded:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return org, None
+
+    def get(self, organization_id):
+        # Returns the cached organization or None, loading the list when it is missing or expired. An id that is
+        # not in a fresh copy is left to the caller, which fetches that organization on its own
+        with self._lock:
+            reloaded = False
+            if self.ttl and self._expired():
+                if self._load() is not None:
+                    self.misses += 1
+                    return None
+                reloaded = True
+            org = None if self._expired() else self._by_id.get(organization_id)
+            if org is None or reloaded:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return org
+
+    def store(self, organization):
+        # Keeps an organization fetched on its own, so that later get() calls for it are answered from memory
+        with self._lock:
+            if not self._expired() and organization.get("id") is not None:
+                self._by_id[organization["id"]] = organization
+
+    def get_by_name(self, organization_name, parent_organization_name):
+        return self._lookup("_by_name", (organization_name, parent_organization_name))
+
+    def get_by_path(self, path):
+        return self._lookup("_by_path", path.strip("/"))
+
+    def unresolved_in_path(self, path):
+        # Organizations without a known path that are named in path, so that a missed path lookup may not
+        # mean that the organization does not exist
+        names = set(path.strip("/").split("/"))
+        with self._lock:
+            return [org for org in self.unresolved if org["name"] in names]
+
+    def paths(self):
+        # Returns {organization id: full path} for the cached copy, loading it if necessary
+        with self._lock:
+            if self._expired():
+                self._load()
+            return {org["id"]: path for path, org in self._by_path.items()}
+
 
 class APIClient:
 
-    def __init__(self, control_url, username, password, organization_name, certificate_file):
+    def __init__(self, control_url, username, password, organization_name, certificate_file,
+                 organization_cache_ttl=300):
         # Set up the endpoint to be used by all requests: "https://<host>/api/devices/"
         self.control_url = control_url
         if not self.control_url.endswith('/'):
@@ -78,7 +565,7 @@ class APIClient:
         # This is for demo purposes only. Production environments should always use cert
         # validation as a best practice
         urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-        self.session = requests.Session()
+        self.session = gluware_rest_api_metrics.InstrumentedSession()
         self.session.verify = False
         # If certificate validation is enabled, the CA certificate file will be used to validate
         # the API endpoint if the host cert is not in the default trust store
@@ -89,79 +576,207 @@ class APIClient:
         # all requests to the REST API
         self.session.auth = (username, password)
         # Sets up request pooling which is useful for multi threaded applications
-        adapter = requests.adapters.HTTPAdapter(pool_connections=100, pool_maxsize=100)
+        # The bulk methods size their worker pools to pool_maxsize
+        self.pool_maxsize = 100
+        self.cache_adapter = None
+        self._mount(requests.adapters.HTTPAdapter(pool_connections=100, pool_maxsize=self.pool_maxsize))
+        # In-memory organization list used by the organization lookups
+        self.organization_cache = OrganizationCache(self, organization_cache_ttl)
+
+    def _mount(self, adapter):
+        # The transport adapter used for all requests; the HTTP cache, when enabled, wraps it
+        self.adapter = adapter
+        if self.cache_adapter is not None:
+            self.cache_adapter.adapter = adapter
+            adapter = self.cache_adapter
         self.session.mount('https://', adapter)
         self.session.mount('http://', adapter)
 
+    def enable_resilience(self, **options):
+        adapter = gluware_rest_api_resilience.ResilientHTTPAdapter(pool_connections=100,
+                                                                   pool_maxsize=self.pool_maxsize, **options)
+        self._mount(adapter)
+        return adapter
+
+    def enable_cache(self, store=None, max_age=0):
+        self.cache_adapter = gluware_rest_api_cache.CachingAdapter(self.adapter, store, max_age)
+        self._mount(self.adapter)
+        return self.cache_adapter
+
+    def add_request_observer(self, observer):
+        self.session.observers.append(observer)
+
+    def enable_metrics(self, **options):
+        metrics = gluware_rest_api_metrics.RequestMetrics(**options)
+        self.add_request_observer(metrics)
+        return metrics
+
     def get_devices(self, query_details):
         r = self.session.get(self.control_url[:-1], params=query_details)
-        if r.status_code == 200:
-            return {"response_code": r.status_code, "response_content": r.json()}
-        else:
-            return {"response_code": r.status_code, "response_content": r.text}
+        return APIResponse(r)
+
+    def iter_devices(self, query_details, page_size=None, page_size_param="limit", page_offset_param="offset"):
+        if page_size is None:
+            with self.session.get(self.control_url[:-1], params=query_details, stream=True) as r:
+                if r.status_code != 200:
+                    raise APIClientError(r.status_code, r.text)
+                if r.encoding is None:
+                    r.encoding = "utf-8"
+                yield from iter_json_array(r.iter_content(chunk_size=65536, decode_unicode=True))
+            return
+        offset = 0
+        previous_ids = set()
+        while True:
+            params = dict(query_details or {})
+            params[page_size_param] = page_size
+            params[page_offset_param] = offset
+            resp = self.get_devices(params)
+            if resp["response_code"] != 200:
+                raise APIClientError(resp["response_code"], resp["response_content"])
+            page = resp["response_content"]
+            page_ids = {device.get("id") for device in page}
+            if len(page) > page_size or (page and page_ids <= previous_ids):
+                raise APIClientError(resp["response_code"], "The server ignored the {}/{} paging parameters; "
+                                     "use page_size=None".format(page_size_param, page_offset_param))
+            previous_ids = page_ids
+            yield from page
+            if len(page) < page_size:
+                return
+            offset += len(page)
 
     def get_device(self, device_id):
         r = self.session.get(self.control_url + device_id)
-        if r.status_code == 200:
-            return {"response_code": r.status_code, "response_content": r.json()}
-        else:
-            return {"response_code": r.status_code, "response_content": r.text}
+        return APIResponse(r)
 
     def create_device(self, device_details):
-        r = self.session.post(self.control_url[:-1], json=device_details)
-        if r.status_code == 200:
-            return {"response_code": r.status_code, "response_content": r.json()}
-        else:
-            return {"response_code": r.status_code, "response_content": r.text}
+        r = self.session.post(self.control_url[:-1], data=gluware_json_codec.dumps(device_details),
+                              headers=JSON_HEADERS)
+        return APIResponse(r)
 
     def update_device(self, device_id, device_details):
-        r = self.session.put(self.control_url + device_id, json=device_details)
-        if r.status_code == 200:
-            return {"response_code": r.status_code, "response_content": r.json()}
-        else:
-            return {"response_code": r.status_code, "response_content": r.text}
+        r = self.session.put(self.control_url + device_id, data=gluware_json_codec.dumps(device_details),
+                             headers=JSON_HEADERS)
+        return APIResponse(r)
 
     def discover_devices(self, device_details):
-        r = self.session.post(self.control_url + "discover", json=device_details)
-        if r.status_code == 200:
-            return {"response_code": r.status_code, "response_content": r.json()}
-        else:
-            return {"response_code": r.status_code, "response_content": r.text}
+        r = self.session.post(self.control_url + "discover", data=gluware_json_codec.dumps(device_details),
+                              headers=JSON_HEADERS)
+        return APIResponse(r)
 
     def delete_device(self, device_id):
         r = self.session.delete(self.control_url + device_id)
-        print(r.url)
-        print(r.text)
-        if r.status_code == 200:
-            return {"response_code": r.status_code, "response_content": r.json()}
+        return APIResponse(r)
+
+    def bulk_get_devices(self, device_ids, max_workers=None):
+        return BulkResults("get", self.get_device, device_ids, max_workers or self.pool_maxsize)
+
+    def bulk_create_devices(self, device_details, max_workers=None):
+        return BulkResults("create", self.create_device, device_details, max_workers or self.pool_maxsize)
+
+    def bulk_update_devices(self, updates, max_workers=None):
+        return BulkResults("update", lambda update: self.update_device(*update), updates,
+                           max_workers or self.pool_maxsize)
+
+    def bulk_delete_devices(self, device_ids, max_workers=None):
+        return BulkResults("delete", self.delete_device, device_ids, max_workers or self.pool_maxsize)
+
+    def reconcile_devices(self, desired_states, dry_run=False, query_details=None, fetch_by_id=False,
+                          ignore_fields=(), max_workers=None):
+        desired_by_id = {state["id"]: state for state in desired_states}
+        ignore_fields = set(ignore_fields)
+        summary = {"total": len(desired_by_id), "unchanged": 0, "changed": 0, "missing": 0, "updated": 0,
+                   "failed": 0, "dry_run": dry_run, "diffs": {}, "missing_ids": [], "failures": []}
+        updates = []
+        fetch_failures = []
+
+        def compare(current):
+            desired = desired_by_id.pop(current["id"])
+            changes = diff_device(current, desired, ignore_fields)
+            if not changes:
+                summary["unchanged"] += 1
+                return
+            summary["changed"] += 1
+            summary["diffs"][current["id"]] = changes
+            changed_keys = {change["field"].split(".", 1)[0] for change in changes}
+            updates.append((current["id"], {key: desired[key] for key in desired if key in changed_keys}))
+
+        if fetch_by_id:
+            for result in self.bulk_get_devices(list(desired_by_id), max_workers or self.pool_maxsize):
+                if result["response_code"] == 200:
+                    compare(result["response_content"])
+                elif result["response_code"] != 404:
+                    # Not known to be missing: the device could not be fetched, so it is failed rather than missing
+                    desired_by_id.pop(result["item"])
+                    fetch_failures.append({"index": result["index"], "item": result["item"],
+                                           "response_code": result["response_code"],
+                                           "response_content": result["response_content"]})
         else:
-            return {"response_code": r.status_code, "response_content": r.text}
+            for current in self.iter_devices(query_details):
+                if current.get("id") in desired_by_id:
+                    compare(current)
+        summary["missing_ids"] = list(desired_by_id)
+        summary["missing"] = len(desired_by_id)
+        summary["failed"] = len(fetch_failures)
+        summary["failures"] = fetch_failures
+        if not dry_run and updates:
+            results = self.bulk_update_devices(updates, max_workers)
+            results.wait()
+            summary["updated"] = results.succeeded
+            summary["failed"] += len(results.failures)
+            summary["failures"] = fetch_failures + results.failures
+        return summary
 
     def get_organizations(self):
         org_url = self.control_url[:-12] + "api/organizations"
         r = self.session.get(org_url)
-        if r.status_code == 200:
-            return {"response_code": r.status_code, "response_content": r.json()}
-        else:
-            return {"response_code": r.status_code, "response_content": r.text}
+        return APIResponse(r)
 
     def get_organization(self, organization_id):
+        org = self.organization_cache.get(organization_id)
+        if org is not None:
+            return {"response_code": 200, "response_content": org}
         org_url = self.control_url[:-12] + "api/organizations"
         r = self.session.get(org_url + '/' + organization_id)
-        if r.status_code == 200:
-            return {"response_code": r.status_code, "response_content": r.json()}
-        else:
-            return {"response_code": r.status_code, "response_content": r.text}
+        resp = APIResponse(r)
+        if resp["response_code"] == 200 and isinstance(resp["response_content"], dict):
+            self.organization_cache.store(resp["response_content"])
+        return resp
 
-    def get_organization_id_by_name(self, organization_name, parent_organization_name):
+    def resolve_organization_parent(self, organization, candidates):
+        # Picks the parent of an organization among several organizations with its parentName, using the
+        # parentId of the organization's own GET response when it has one; None when it cannot be told apart.
+        # Bypasses the organization cache, which calls this while it is being loaded
         org_url = self.control_url[:-12] + "api/organizations"
-        r = self.session.get(org_url)
-        if r.status_code == 200:
-            for org in r.json():
-                if org["name"] == organization_name and org["parentName"] == parent_organization_name:
-                    return {"response_code": r.status_code, "response_content": org["id"]}
+        try:
+            resp = APIResponse(self.session.get(org_url + '/' + organization["id"]))
+        except requests.exceptions.RequestException:
+            return None
+        if resp["response_code"] != 200 or not isinstance(resp["response_content"], dict):
+            return None
+        parent_id = resp["response_content"].get("parentId")
+        for candidate in candidates:
+            if candidate["id"] == parent_id:
+                return candidate
+        return None
+
+    def get_organization_id_by_name(self, organization_name, parent_organization_name):
+        org, error = self.organization_cache.get_by_name(organization_name, parent_organization_name)
+        if error is not None:
+            return error
+        if org is None:
             return {"response_code": 404, "response_content": "Organization Not Found"}
-        elif r.status_code == 200:
-            return {"response_code": r.status_code, "response_content": r.json()}
-        else:
-            return {"response_code": r.status_code, "response_content": r.text}
+        return {"response_code": 200, "response_content": org["id"]}
+
+    def get_organization_by_path(self, path):
+        org, error = self.organization_cache.get_by_path(path)
+        if error is not None:
+            return error
+        if org is None:
+            unresolved = self.organization_cache.unresolved_in_path(path)
+            if unresolved:
+                names = ", ".join("{} (parentName {})".format(org["name"], org.get("parentName"))
+                                  for org in unresolved)
+                return {"response_code": 409,
+                        "response_content": "Organization path cannot be resolved, ambiguous parent of: " + names}
+            return {"response_code": 404, "response_content": "Organization Not Found"}
+        return {"response_code": 200, "response_content": org}
@@ -0,0 +1,57 @@
+# /* Copyright (C) 2019 Gluware - All Rights Reserved
+# * This code is provided “as is” with no implied warranties or fitness
+# * for a particular purpose. Gluware, Inc. is under no obligation to
+# * provide maintenance, support, updates, enhancements or modifications.
+# */
+
+# REQUIRED PYTHON VERSION: 3.x
+# Optional Python modules:
+# orjson, ujson
+
+# JSON codec used by the REST API clients to decode response bodies and encode request bodies.
+# The fastest available codec is chosen at import time: orjson, then ujson, then the standard library json
+# module. set_codec(name) switches to a specific one ("orjson", "ujson" or "json"), e.g. to compare them.
+# Callers must look the functions up through the module (gluware_json_codec.loads(...)) so that set_codec
+# takes effect everywhere.
+#
+# loads - Decodes JSON from bytes or str
+# dumps - Encodes an object to JSON bytes
+# CODEC_NAME - Name of the codec in use
+
+import json
+
+
+def _stdlib_codec():
+    def dumps(obj):
+        return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+    return json.loads, dumps
+
+
+def _orjson_codec():
+    import orjson
+    return orjson.loads, orjson.dumps
+
+
+def _ujson_codec():
+    import ujson
+
+    def dumps(obj):
+        return ujson.dumps(obj, ensure_ascii=False).encode("utf-8")
+    return ujson.loads, dumps
+
+
+_CODECS = {"orjson": _orjson_codec, "ujson": _ujson_codec, "json": _stdlib_codec}
+
+
+def set_codec(name):
+    global loads, dumps, CODEC_NAME
+    loads, dumps = _CODECS[name]()
+    CODEC_NAME = name
+
+
+for _name in ("orjson", "ujson", "json"):
+    try:
+        set_codec(_name)
+        break
+    except ImportError:
+        pass
@@ -0,0 +1,310 @@
+# /* Copyright (C) 2019 Gluware - All Rights Reserved
+# * This code is provided “as is” with no implied warranties or fitness
+# * for a particular purpose. Gluware, Inc. is under no obligation to
+# * provide maintenance, support, updates, enhancements or modifications.
+# */
+
+# REQUIRED PYTHON VERSION: 3.7+
+# Supports Gluware REST API v1
+# Required Python modules:
+# none (standard library only)
+
+# A local stand-in for a Gluware Control host, used to exercise and benchmark APIClient without a live system.
+# It is NOT a faithful implementation of Gluware Control: it only serves the endpoints used by APIClient,
+# with in-memory data, and accepts any credentials.
+#
+# Endpoints:
+#     GET    /api/devices               all devices, filtered by any query parameter that matches a device
+#                                       attribute (e.g. ?orgId=...), paged when limit/offset are given
+#     POST   /api/devices               creates a device (name and orgId are required)
+#     GET    /api/devices/{id}
+#     PUT    /api/devices/{id}          merges the JSON body into the device
+#     DELETE /api/devices/{id}
+#     POST   /api/devices/discover      {"devices": [ids]}; each device reports discoveryStatus "pending" for
+#                                       discovery_seconds and then "discovered" (or "failed" for
+#                                       discovery_failure_rate of them)
+#     GET    /api/organizations
+#     GET    /api/organizations/{id}
+#
+# Organizations carry parentName only, as in the documented organization list, so clients have to resolve the
+# hierarchy by name; with parent_ids=True (--parent-ids) they also carry parentId.
+# GET responses carry an ETag and are answered with 304 Not Modified when If-None-Match matches it.
+# Every request is delayed by latency seconds (plus a random jitter of up to latency_jitter seconds), and
+# fails with a 503 and a Retry-After header with probability error_rate.
+#
+# Usage from Python:
+#     with MockController(devices=100000, organizations=5000, latency=0.005) as controller:
+#         client = APIClient(controller.url, "user", "password", "", None)
+#
+# Usage from the command line:
+#     python gluware_mock_controller.py --port 8080 --devices 100000 --organizations 5000 --latency 0.005
+
+import argparse
+import hashlib
+import http.server
+import json
+import random
+import threading
+import time
+import urllib.parse
+import uuid
+
+
+class MockData:
+
+    def __init__(self, devices=1000, organizations=50, seed=0, parent_ids=False):
+        rng = random.Random(seed)
+        root = {"id": str(uuid.UUID(int=rng.getrandbits(128))), "name": "GluwareSystemOrganization",
+                "parentName": None}
+        self.organizations = {root["id"]: root}
+        parents = [root]
+        for index in range(organizations - 1):
+            parent = rng.choice(parents)
+            org = {"id": str(uuid.UUID(int=rng.getrandbits(128))), "name": "Org{}".format(index),
+                   "parentName": parent["name"]}
+            if parent_ids:
+                org["parentId"] = parent["id"]
+            self.organizations[org["id"]] = org
+            parents.append(org)
+        org_ids = list(self.organizations)
+        self.devices = {}
+        for index in range(devices):
+            device_id = str(uuid.UUID(int=rng.getrandbits(128)))
+            self.devices[device_id] = {
+                "id": device_id,
+                "name": "device-{}".format(index),
+                "orgId": rng.choice(org_ids),
+                "description": "",
+                "discoveryStatus": rng.choice(("discovered", "discovered", "discovered", "failed", "none")),
+                "connectionInformation": {"ip": "10.{}.{}.{}".format(index >> 16 & 255, index >> 8 & 255,
+                                                                     index & 255),
+                                          "userName": "admin", "type": "ssh", "port": "22", "proxyList": []}}
+        self.lock = threading.Lock()
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; without TCP_NODELAY each response stalls on delayed ACKs
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _delay_or_fail(self):
+        server = self.server
+        if server.latency or server.latency_jitter:
+            time.sleep(server.latency + random.random() * server.latency_jitter)
+        if server.error_rate and random.random() < server.error_rate:
+            self._send(503, "Service Unavailable", {"Retry-After": "1"})
+            return True
+        return False
+
+    def _send(self, status, content, headers=None):
+        if isinstance(content, str):
+            body = content.encode("utf-8")
+            content_type = "text/plain"
+        else:
+            body = json.dumps(content).encode("utf-8")
+            content_type = "application/json"
+        if self.command == "GET" and status == 200:
+            # Conditional GET support: the ETag is derived from the body
+            etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+            headers = dict(headers or {}, ETag=etag)
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return None
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            return None
+
+    def _route(self):
+        url = urllib.parse.urlsplit(self.path)
+        segments = [segment for segment in url.path.split("/") if segment]
+        if len(segments) < 2 or segments[0] != "api" or segments[1] not in ("devices", "organizations"):
+            return None, None, None
+        query = dict(urllib.parse.parse_qsl(url.query))
+        return segments[1], segments[2] if len(segments) > 2 else None, query
+
+    def do_GET(self):
+        # Read the body, if any, before replying so keep-alive connections stay in sync
+        self._read_json()
+        if self._delay_or_fail():
+            return
+        collection, item_id, query = self._route()
+        data = self.server.data
+        with data.lock:
+            if collection == "devices" and item_id is None:
+                limit = query.pop("limit", None)
+                offset = int(query.pop("offset", 0))
+                devices = [device for device in data.devices.values()
+                           if all(str(device.get(key)) == value for key, value in query.items())]
+                if limit is not None:
+                    devices = devices[offset:offset + int(limit)]
+                self._send(200, devices)
+            elif collection == "devices" and item_id in data.devices:
+                self._send(200, data.devices[item_id])
+            elif collection == "organizations" and item_id is None:
+                self._send(200, list(data.organizations.values()))
+            elif collection == "organizations" and item_id in data.organizations:
+                self._send(200, data.organizations[item_id])
+            else:
+                self._send(404, "Not Found")
+
+    def do_POST(self):
+        body = self._read_json()
+        if self._delay_or_fail():
+            return
+        collection, item_id, _ = self._route()
+        data = self.server.data
+        with data.lock:
+            if collection == "devices" and item_id is None:
+                if not isinstance(body, dict) or "name" not in body or body.get("orgId") not in data.organizations:
+                    self._send(400, "name and a valid orgId are required")
+                    return
+                device = dict(body, id=str(uuid.uuid4()), discoveryStatus="none")
+                data.devices[device["id"]] = device
+                self._send(200, device)
+            elif collection == "devices" and item_id == "discover":
+                ids = body.get("devices", []) if isinstance(body, dict) else []
+                unknown = [device_id for device_id in ids if device_id not in data.devices]
+                if unknown:
+                    self._send(404, "Unknown devices: " + ", ".join(unknown))
+                    return
+                finish_at = time.monotonic() + self.server.discovery_seconds
+                for device_id in ids:
+                    data.devices[device_id]["discoveryStatus"] = "pending"
+                    self.server.discoveries[device_id] = finish_at
+                self._send(200, {"status": "starting"})
+                threading.Timer(self.server.discovery_seconds, self.server.finish_discoveries).start()
+            else:
+                self._send(404, "Not Found")
+
+    def do_PUT(self):
+        body = self._read_json()
+        if self._delay_or_fail():
+            return
+        collection, item_id, _ = self._route()
+        data = self.server.data
+        with data.lock:
+            if collection == "devices" and item_id in data.devices and isinstance(body, dict):
+                body.pop("id", None)
+                data.devices[item_id].update(body)
+                self._send(200, data.devices[item_id])
+            elif collection == "devices" and item_id in data.devices:
+                self._send(400, "Invalid device details")
+            else:
+                self._send(404, "Not Found")
+
+    def do_DELETE(self):
+        self._read_json()
+        if self._delay_or_fail():
+            return
+        collection, item_id, _ = self._route()
+        data = self.server.data
+        with data.lock:
+            if collection == "devices" and item_id in data.devices:
+                del data.devices[item_id]
+                self._send(200, {"id": item_id})
+            else:
+                self._send(404, "Not Found")
+
+
+class MockController:
+
+    def __init__(self, host="127.0.0.1", port=0, devices=1000, organizations=50, latency=0.0, latency_jitter=0.0,
+                 error_rate=0.0, discovery_seconds=1.0, discovery_failure_rate=0.1, seed=0, parent_ids=False):
+        self.server = http.server.ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.data = MockData(devices, organizations, seed, parent_ids)
+        self.server.latency = latency
+        self.server.latency_jitter = latency_jitter
+        self.server.error_rate = error_rate
+        self.server.discovery_seconds = discovery_seconds
+        self.server.discoveries = {}
+        self.server.finish_discoveries = self._finish_discoveries
+        self.discovery_failure_rate = discovery_failure_rate
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return "http://{}:{}".format(host, port)
+
+    @property
+    def data(self):
+        return self.server.data
+
+    def _finish_discoveries(self):
+        now = time.monotonic()
+        data = self.server.data
+        with data.lock:
+            for device_id, finish_at in list(self.server.discoveries.items()):
+                if finish_at <= now:
+                    del self.server.discoveries[device_id]
+                    if device_id in data.devices:
+                        failed = random.random() < self.discovery_failure_rate
+                        data.devices[device_id]["discoveryStatus"] = "failed" if failed else "discovered"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="gluware-mock-controller",
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for a Gluware Control REST API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--organizations", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--latency-jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--discovery-seconds", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--parent-ids", action="store_true", help="include parentId in organizations")
+    args = parser.parse_args()
+    controller = MockController(args.host, args.port, args.devices, args.organizations, args.latency,
+                                args.latency_jitter, args.error_rate, args.discovery_seconds, seed=args.seed,
+                                parent_ids=args.parent_ids)
+    print("Mock Gluware Control listening on " + controller.url, flush=True)
+    try:
+        controller.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        controller.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
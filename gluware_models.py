@@ -0,0 +1,197 @@
+# /* Copyright (C) 2019 Gluware - All Rights Reserved
+# * This code is provided “as is” with no implied warranties or fitness
+# * for a particular purpose. Gluware, Inc. is under no obligation to
+# * provide maintenance, support, updates, enhancements or modifications.
+# */
+
+# REQUIRED PYTHON VERSION: 3.10+
+# Supports Gluware REST API v1
+
+# Optional typed models for the device and organization dicts returned by the REST API, for holding large
+# inventories in memory. Each model is a dataclass with __slots__, so an instance has no per-instance __dict__,
+# and repeated short strings (orgId, discoveryStatus, connection type, port, ...) are interned so that all
+# devices share a single copy of each value. Fields the models do not know about are kept in the extra
+# attribute as a tuple of (name, value) pairs, or None when there are none. Known fields that are absent from
+# the dict are ABSENT, a falsy sentinel, while a field that is present with a null value is None, so nothing is
+# lost by a round trip through from_dict and to_dict. Attribute names are the snake_case form of the API names
+# (orgId -> org_id).
+#
+# Device.from_dict / to_dict - Converts between a device dict and a Device (with a ConnectionInformation)
+# Organization.from_dict / to_dict - Converts between an organization dict and an Organization
+# devices_from_response - Devices from a get_devices or get_device response, e.g.
+#                         devices_from_response(client.get_devices({"orgId": org_id}))
+# organizations_from_response - Organizations from a get_organizations or get_organization response
+# iter_device_models - Streams Devices from APIClient.iter_devices without holding the raw dicts
+# to_columns - Columnar export: {"name": [...], "orgId": [...], "connectionInformation.ip": [...], ...} for a
+#              sequence of models, using the API field names (dotted for nested fields), for bulk analytics
+#              (e.g. pandas.DataFrame(to_columns(devices)))
+
+import dataclasses
+import sys
+
+import gluware_device_rest_api_client
+
+
+class _Absent:
+    __slots__ = ()
+
+    def __bool__(self):
+        return False
+
+    def __repr__(self):
+        return "ABSENT"
+
+    def __reduce__(self):
+        # Copies and unpickled models keep the same sentinel
+        return "ABSENT"
+
+
+# Value of the known fields that the dict did not have
+ABSENT = _Absent()
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) and len(value) <= 64 else value
+
+
+class _Model:
+    # Empty so that the slotted subclasses get no per-instance __dict__ from this base
+    __slots__ = ()
+    # (attribute name, API name, intern the value) for every known field; set by each model class
+    FIELDS = ()
+
+    @classmethod
+    def _known_values(cls, data):
+        values = {}
+        for attribute, name, intern in cls.FIELDS:
+            if name in data:
+                values[attribute] = _intern(data[name]) if intern else data[name]
+        known = {name for _, name, _ in cls.FIELDS}
+        extra = tuple((_intern(key), value) for key, value in data.items() if key not in known)
+        values["extra"] = extra or None
+        return values
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**cls._known_values(data))
+
+    def to_dict(self):
+        data = {}
+        for attribute, name, _ in self.FIELDS:
+            value = getattr(self, attribute)
+            if value is not ABSENT:
+                data[name] = value.to_dict() if isinstance(value, _Model) else value
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def get(self, name, default=None):
+        # Value of a field by its API name, including fields kept in extra
+        for attribute, field_name, _ in self.FIELDS:
+            if field_name == name:
+                value = getattr(self, attribute)
+                return default if value is ABSENT else value
+        for key, value in self.extra or ():
+            if key == name:
+                return value
+        return default
+
+
+@dataclasses.dataclass(slots=True)
+class ConnectionInformation(_Model):
+    ip: str = ABSENT
+    user_name: str = ABSENT
+    password: str = dataclasses.field(default=ABSENT, repr=False)
+    enable_password: str = dataclasses.field(default=ABSENT, repr=False)
+    type: str = ABSENT
+    port: str = ABSENT
+    proxy_list: list = ABSENT
+    extra: tuple = None
+
+    FIELDS = (("ip", "ip", False), ("user_name", "userName", True), ("password", "password", False),
+              ("enable_password", "enablePassword", False), ("type", "type", True), ("port", "port", True),
+              ("proxy_list", "proxyList", False))
+
+
+@dataclasses.dataclass(slots=True)
+class Device(_Model):
+    id: str = ABSENT
+    name: str = ABSENT
+    org_id: str = ABSENT
+    description: str = ABSENT
+    discovery_status: str = ABSENT
+    connection_information: ConnectionInformation = ABSENT
+    extra: tuple = None
+
+    FIELDS = (("id", "id", False), ("name", "name", False), ("org_id", "orgId", True),
+              ("description", "description", True), ("discovery_status", "discoveryStatus", True),
+              ("connection_information", "connectionInformation", False))
+
+    @classmethod
+    def from_dict(cls, data):
+        values = cls._known_values(data)
+        if isinstance(values.get("connection_information"), dict):
+            values["connection_information"] = ConnectionInformation.from_dict(values["connection_information"])
+        return cls(**values)
+
+
+@dataclasses.dataclass(slots=True)
+class Organization(_Model):
+    id: str = ABSENT
+    name: str = ABSENT
+    parent_id: str = ABSENT
+    parent_name: str = ABSENT
+    extra: tuple = None
+
+    FIELDS = (("id", "id", False), ("name", "name", True), ("parent_id", "parentId", True),
+              ("parent_name", "parentName", True))
+
+
+def _from_response(model, resp):
+    if resp["response_code"] != 200:
+        raise gluware_device_rest_api_client.APIClientError(resp["response_code"], resp["response_content"])
+    content = resp["response_content"]
+    if isinstance(content, dict):
+        return [model.from_dict(content)]
+    return [model.from_dict(item) for item in content]
+
+
+def devices_from_response(resp):
+    return _from_response(Device, resp)
+
+
+def organizations_from_response(resp):
+    return _from_response(Organization, resp)
+
+
+def iter_device_models(client, query_details=None, **options):
+    for device in client.iter_devices(query_details, **options):
+        yield Device.from_dict(device)
+
+
+def _flatten(model, prefix, row):
+    for attribute, name, _ in model.FIELDS:
+        value = getattr(model, attribute)
+        if isinstance(value, _Model):
+            _flatten(value, prefix + name + ".", row)
+        else:
+            row[prefix + name] = None if value is ABSENT else value
+    for key, value in model.extra or ():
+        row[prefix + key] = value
+
+
+def to_columns(models, fields=None):
+    columns = {name: [] for name in fields} if fields is not None else {}
+    count = 0
+    for model in models:
+        row = {}
+        _flatten(model, "", row)
+        if fields is None:
+            for name in row:
+                if name not in columns:
+                    # A column first seen part way through is padded for the rows before it
+                    columns[name] = [None] * count
+        for name, column in columns.items():
+            column.append(row.get(name))
+        count += 1
+    return columns
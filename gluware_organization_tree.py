@@ -0,0 +1,133 @@
+# /* Copyright (C) 2019 Gluware - All Rights Reserved
+# * This code is provided “as is” with no implied warranties or fitness
+# * for a particular purpose. Gluware, Inc. is under no obligation to
+# * provide maintenance, support, updates, enhancements or modifications.
+# */
+
+# REQUIRED PYTHON VERSION: 3.x
+# Supports Gluware REST API v1
+# Required Python modules:
+# requests, urllib3 (through gluware_device_rest_api_client.py)
+
+# In-memory organization hierarchy built once from the flat list returned by APIClient.get_organizations.
+# Every OrganizationNode has parent/children links and a precomputed full path such as
+# "GluwareSystemOrganization/Production/US". Organizations whose ancestry cannot be resolved unambiguously
+# (see gluware_device_rest_api_client.organization_paths) are left out of the tree and listed in unresolved.
+#
+# Example:
+#     tree = OrganizationTree.from_client(client)
+#     for device in tree.subtree_devices(client, "GluwareSystemOrganization/Production"):
+#         ...
+#
+# from_client - Builds the tree from client.get_organizations(); raises APIClientError if that fails. Ambiguous
+#               parents are looked up with client.resolve_organization_parent
+# get - Node by organization id, or None
+# find - Node by full path, or None
+# resolve - Node by id, path or node; raises KeyError if unknown
+# descendants - Yields a node and all nodes below it (include_self=False leaves out the node itself)
+# subtree_devices - Yields every device in an organization and all organizations below it. One
+#                   get_devices({"orgId": ...}) request per organization is sent over a pool of max_workers
+#                   threads, and the devices of each organization are yielded as soon as its request completes.
+#                   Raises APIClientError if any request fails. Raises UnresolvedOrganizationError, before any
+#                   request is sent, if an unresolved organization may belong to the subtree (its parentName is
+#                   the name of an organization in the subtree), unless allow_unresolved=True.
+
+import gluware_device_rest_api_client
+
+
+class UnresolvedOrganizationError(Exception):
+
+    def __init__(self, organization, organizations):
+        super().__init__("The subtree of {} may be incomplete: the parent of {} cannot be determined".format(
+            organization, ", ".join("{} (parentName {})".format(org["name"], org.get("parentName"))
+                                    for org in organizations)))
+        self.organization = organization
+        self.organizations = organizations
+
+
+class OrganizationNode:
+
+    def __init__(self, organization, path):
+        self.organization = organization
+        self.id = organization["id"]
+        self.name = organization["name"]
+        self.path = path
+        self.parent = None
+        self.children = []
+
+    def __repr__(self):
+        return "OrganizationNode({!r}, {!r})".format(self.id, self.path)
+
+
+class OrganizationTree:
+
+    def __init__(self, organizations, resolve_parent=None):
+        self.unresolved = []
+        paths = gluware_device_rest_api_client.organization_paths(organizations, resolve_parent, self.unresolved)
+        self.by_id = {}
+        self.by_path = {}
+        for org in organizations:
+            if org["id"] in paths:
+                node = OrganizationNode(org, paths[org["id"]])
+                self.by_id[node.id] = node
+                self.by_path[node.path] = node
+        self.roots = []
+        for node in self.by_id.values():
+            node.parent = self.by_path.get(node.path.rpartition("/")[0])
+            if node.parent is not None:
+                node.parent.children.append(node)
+            else:
+                self.roots.append(node)
+
+    @classmethod
+    def from_client(cls, client):
+        resp = client.get_organizations()
+        if resp["response_code"] != 200:
+            raise gluware_device_rest_api_client.APIClientError(resp["response_code"], resp["response_content"])
+        return cls(resp["response_content"], client.resolve_organization_parent)
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def get(self, organization_id):
+        return self.by_id.get(organization_id)
+
+    def find(self, path):
+        return self.by_path.get(path.strip("/"))
+
+    def resolve(self, organization):
+        if isinstance(organization, OrganizationNode):
+            return organization
+        node = self.by_id.get(organization) or self.find(organization)
+        if node is None:
+            raise KeyError(organization)
+        return node
+
+    def descendants(self, organization, include_self=True):
+        # Iterative depth-first walk so that deep hierarchies cannot hit the recursion limit
+        start = self.resolve(organization)
+        stack = [start]
+        while stack:
+            node = stack.pop()
+            if include_self or node is not start:
+                yield node
+            stack.extend(reversed(node.children))
+
+    def unresolved_below(self, organization):
+        # Unresolved organizations whose parentName is the name of an organization in the subtree
+        names = {node.name for node in self.descendants(organization)}
+        return [org for org in self.unresolved if org.get("parentName") in names]
+
+    def subtree_devices(self, client, organization, max_workers=16, allow_unresolved=False):
+        if not allow_unresolved:
+            unresolved = self.unresolved_below(organization)
+            if unresolved:
+                raise UnresolvedOrganizationError(self.resolve(organization).path, unresolved)
+        org_ids = (node.id for node in self.descendants(organization))
+        results = gluware_device_rest_api_client.BulkResults(
+            "get_devices", lambda org_id: client.get_devices({"orgId": org_id}), org_ids, max_workers)
+        for result in results:
+            if result["response_code"] != 200:
+                raise gluware_device_rest_api_client.APIClientError(result["response_code"],
+                                                                    result["response_content"])
+            yield from result["response_content"]
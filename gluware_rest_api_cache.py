@@ -0,0 +1,244 @@
+# /* Copyright (C) 2019 Gluware - All Rights Reserved
+# * This code is provided “as is” with no implied warranties or fitness
+# * for a particular purpose. Gluware, Inc. is under no obligation to
+# * provide maintenance, support, updates, enhancements or modifications.
+# */
+
+# REQUIRED PYTHON VERSION: 3.x
+# Supports Gluware REST API v1
+# Required Python modules:
+# requests
+
+# Opt-in HTTP response cache for APIClient, enabled with APIClient.enable_cache(...). It is implemented as
+# CachingAdapter, a transport adapter that wraps the adapter otherwise mounted on the client's session (the
+# pooled HTTPAdapter or the ResilientHTTPAdapter), so it works with or without the resilience layer.
+#
+# - 200 responses to GET requests that carry an ETag or Last-Modified header are stored, keyed by full URL
+#   (including query parameters). Streamed requests (stream=True, as used by APIClient.iter_devices) bypass it.
+# - A later GET for the same URL is sent with If-None-Match / If-Modified-Since. When the server answers
+#   304 Not Modified, the stored body is returned as a 200 response, so a polling loop mostly costs 304s.
+#   With max_age > 0, entries younger than max_age seconds are returned without contacting the server at all.
+# - Any other request (POST, PUT, DELETE, ...) sent through the same client drops every cached entry under
+#   the parent collection of its URL: update_device or delete_device on /api/devices/{id}, and create_device
+#   or discover_devices on /api/devices, all invalidate every cached /api/devices... response. This happens
+#   even when the request fails with an error, since the server may have applied it anyway.
+# - Responses served from the cache are marked with response.cache_status "hit" (no request sent) or
+#   "revalidated" (the server answered 304).
+#
+# Stores:
+#     MemoryCacheStore(max_entries=1024) - in-memory store with least-recently-used eviction
+#     DiskCacheStore(directory, max_entries=10000) - one file pair per entry in directory, kept across runs;
+#                                                    least recently stored entries are evicted first
+#
+# Example:
+#     client.enable_cache()                                          # in memory
+#     client.enable_cache(store=DiskCacheStore("~/.cache/gluware"))  # on disk
+
+import collections
+import hashlib
+import json
+import os
+import threading
+import time
+import urllib.parse
+
+import requests
+
+
+class CacheEntry:
+
+    def __init__(self, url, headers, body, stored_at=None):
+        self.url = url
+        self.headers = requests.structures.CaseInsensitiveDict(headers)
+        self.body = body
+        self.stored_at = time.time() if stored_at is None else stored_at
+
+    @property
+    def etag(self):
+        return self.headers.get("ETag")
+
+    @property
+    def last_modified(self):
+        return self.headers.get("Last-Modified")
+
+
+class MemoryCacheStore:
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None:
+                self._entries.move_to_end(url)
+            return entry
+
+    def put(self, entry):
+        with self._lock:
+            self._entries[entry.url] = entry
+            self._entries.move_to_end(entry.url)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_prefix(self, prefix):
+        with self._lock:
+            for url in [url for url in self._entries if url.startswith(prefix)]:
+                del self._entries[url]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskCacheStore:
+
+    def __init__(self, directory, max_entries=10000):
+        self.directory = os.path.expanduser(directory)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        # url -> file name stem, rebuilt from the metadata files on start
+        self._index = collections.OrderedDict()
+        metadata = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                try:
+                    with open(os.path.join(self.directory, name)) as f:
+                        meta = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                metadata.append((meta["stored_at"], meta["url"], name[:-5]))
+        for _, url, stem in sorted(metadata):
+            self._index[url] = stem
+
+    def _paths(self, stem):
+        return os.path.join(self.directory, stem + ".json"), os.path.join(self.directory, stem + ".body")
+
+    def _remove(self, url):
+        for path in self._paths(self._index.pop(url)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def get(self, url):
+        with self._lock:
+            stem = self._index.get(url)
+            if stem is None:
+                return None
+            meta_path, body_path = self._paths(stem)
+            try:
+                with open(meta_path) as f:
+                    meta = json.load(f)
+                with open(body_path, "rb") as f:
+                    body = f.read()
+            except (OSError, ValueError):
+                self._remove(url)
+                return None
+            return CacheEntry(meta["url"], meta["headers"], body, meta["stored_at"])
+
+    def put(self, entry):
+        stem = hashlib.sha256(entry.url.encode("utf-8")).hexdigest()
+        meta_path, body_path = self._paths(stem)
+        with self._lock:
+            # The body is written first so that a metadata file always refers to a complete body
+            with open(body_path, "wb") as f:
+                f.write(entry.body)
+            with open(meta_path, "w") as f:
+                json.dump({"url": entry.url, "headers": dict(entry.headers), "stored_at": entry.stored_at}, f)
+            self._index.pop(entry.url, None)
+            self._index[entry.url] = stem
+            while len(self._index) > self.max_entries:
+                self._remove(next(iter(self._index)))
+
+    def invalidate_prefix(self, prefix):
+        with self._lock:
+            for url in [url for url in self._index if url.startswith(prefix)]:
+                self._remove(url)
+
+    def clear(self):
+        with self._lock:
+            for url in list(self._index):
+                self._remove(url)
+
+    def __len__(self):
+        return len(self._index)
+
+
+def collection_prefix(url):
+    # "https://host/api/devices/74caf003-..." -> "https://host/api/devices"
+    parts = urllib.parse.urlsplit(url)
+    path = parts.path.rstrip("/")
+    if path.count("/") > 2:
+        path = path.rsplit("/", 1)[0]
+    return urllib.parse.urlunsplit((parts.scheme, parts.netloc, path, "", ""))
+
+
+class CachingAdapter(requests.adapters.BaseAdapter):
+
+    def __init__(self, adapter, store=None, max_age=0):
+        super().__init__()
+        self.adapter = adapter
+        self.store = store if store is not None else MemoryCacheStore()
+        self.max_age = max_age
+        self.hits = 0
+        self.revalidations = 0
+        self.misses = 0
+
+    def close(self):
+        self.adapter.close()
+
+    def send(self, request, stream=False, **kwargs):
+        if request.method != "GET":
+            try:
+                return self.adapter.send(request, stream=stream, **kwargs)
+            finally:
+                # Also when sending fails: a timed-out request may still have been applied by the server
+                self.store.invalidate_prefix(collection_prefix(request.url))
+        if stream:
+            return self.adapter.send(request, stream=stream, **kwargs)
+        entry = self.store.get(request.url)
+        if entry is not None:
+            if self.max_age and time.time() - entry.stored_at < self.max_age:
+                self.hits += 1
+                return self._cached_response(request, entry, "hit")
+            if entry.etag:
+                request.headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                request.headers["If-Modified-Since"] = entry.last_modified
+        response = self.adapter.send(request, stream=stream, **kwargs)
+        if entry is not None and response.status_code == 304:
+            self.revalidations += 1
+            entry.stored_at = time.time()
+            # Servers may send updated validators with a 304
+            for name in ("ETag", "Last-Modified"):
+                if name in response.headers:
+                    entry.headers[name] = response.headers[name]
+            self.store.put(entry)
+            retries = getattr(response, "retries", 0)
+            response.close()
+            cached = self._cached_response(request, entry, "revalidated")
+            cached.retries = retries
+            return cached
+        self.misses += 1
+        if response.status_code == 200 and ("ETag" in response.headers or "Last-Modified" in response.headers):
+            self.store.put(CacheEntry(request.url, dict(response.headers), response.content))
+        return response
+
+    def _cached_response(self, request, entry, cache_status):
+        response = requests.models.Response()
+        response.status_code = 200
+        response.reason = "OK"
+        response.headers = requests.structures.CaseInsensitiveDict(entry.headers)
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response._content = entry.body
+        response.url = request.url
+        response.request = request
+        response.cache_status = cache_status
+        return response
@@ -0,0 +1,243 @@
+# /* Copyright (C) 2019 Gluware - All Rights Reserved
+# * This code is provided “as is” with no implied warranties or fitness
+# * for a particular purpose. Gluware, Inc. is under no obligation to
+# * provide maintenance, support, updates, enhancements or modifications.
+# */
+
+# REQUIRED PYTHON VERSION: 3.x
+# Supports Gluware REST API v1
+# Required Python modules:
+# requests
+
+# This module provides request-level instrumentation for APIClient.
+#
+# InstrumentedSession is the requests.Session used by APIClient. After every request it calls each of its
+# observers with a record of that request:
+#     {"method": "GET", "endpoint": "GET /api/devices/{id}", "url": ..., "status": 200 (None on a connection
+#      error), "latency": seconds, "bytes_sent": ..., "bytes_received": ..., "retries": ..., "error": None,
+#      "cache": None, "hit" or "revalidated" when the HTTP cache is enabled}
+# Ids in the URL path are replaced with {id} so that all requests to the same endpoint are grouped together.
+# Latency covers the whole call including reading the body, except for streamed requests (stream=True, as
+# used by APIClient.iter_devices) where it stops once the headers have arrived and bytes_received is taken
+# from the Content-Length header. retries is the number of retries done by the resilience layer, if enabled.
+#
+# RequestMetrics is an observer that aggregates records per endpoint: request counts by status, bytes
+# transferred, retries, a latency histogram and p50/p95/p99 latencies (estimated from a uniform sample of
+# up to sample_size latencies per endpoint). It can be exported with to_prometheus() in the Prometheus text
+# format or with to_json(). Its workflow(name) context manager times a whole block of calls.
+#
+# Example:
+#     metrics = client.enable_metrics()
+#     with metrics.workflow("inventory sync"):
+#         ...
+#     print(metrics.to_prometheus())
+
+import bisect
+import contextlib
+import json
+import random
+import re
+import threading
+import time
+import urllib.parse
+
+import requests
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_ID_SEGMENT = re.compile(r"^([0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}"
+                         r"|[0-9a-fA-F]{16,}|[0-9]+)$")
+
+
+def endpoint_template(method, url):
+    path = urllib.parse.urlsplit(url).path
+    segments = ["{id}" if _ID_SEGMENT.match(segment) else segment for segment in path.split("/")]
+    return method.upper() + " " + "/".join(segments)
+
+
+def _body_length(body):
+    if body is None:
+        return 0
+    if isinstance(body, str):
+        return len(body.encode("utf-8"))
+    if isinstance(body, (bytes, bytearray)):
+        return len(body)
+    return 0
+
+
+class InstrumentedSession(requests.Session):
+
+    def __init__(self):
+        super().__init__()
+        self.observers = []
+
+    def request(self, method, url, *args, **kwargs):
+        if not self.observers:
+            return super().request(method, url, *args, **kwargs)
+        start = time.perf_counter()
+        try:
+            response = super().request(method, url, *args, **kwargs)
+        except requests.exceptions.RequestException as e:
+            request = getattr(e, "request", None)
+            self._notify({"method": method.upper(), "endpoint": endpoint_template(method, url), "url": url,
+                          "status": None, "latency": time.perf_counter() - start,
+                          "bytes_sent": _body_length(getattr(request, "body", None)), "bytes_received": 0,
+                          "retries": getattr(e, "retries", 0), "error": type(e).__name__, "cache": None})
+            raise
+        latency = time.perf_counter() - start
+        cache_status = getattr(response, "cache_status", None)
+        if cache_status is not None:
+            # Served from the HTTP cache: no body was transferred
+            bytes_received = 0
+        elif kwargs.get("stream"):
+            bytes_received = int(response.headers.get("Content-Length") or 0)
+        else:
+            bytes_received = len(response.content or b"")
+        self._notify({"method": method.upper(), "endpoint": endpoint_template(method, url), "url": response.url,
+                      "status": response.status_code, "latency": latency,
+                      "bytes_sent": _body_length(response.request.body), "bytes_received": bytes_received,
+                      "retries": getattr(response, "retries", 0), "error": None, "cache": cache_status})
+        return response
+
+    def _notify(self, record):
+        for observer in self.observers:
+            observer(record)
+
+
+class _EndpointStats:
+
+    def __init__(self, buckets, sample_size):
+        self.count = 0
+        self.latency_sum = 0.0
+        self.bucket_counts = [0] * (len(buckets) + 1)
+        self.statuses = {}
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.retries = 0
+        self.errors = 0
+        self.sample = []
+        self.sample_size = sample_size
+
+    def add(self, record, buckets):
+        self.count += 1
+        self.latency_sum += record["latency"]
+        self.bucket_counts[bisect.bisect_left(buckets, record["latency"])] += 1
+        status = str(record["status"]) if record["status"] is not None else "error"
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        self.bytes_sent += record["bytes_sent"]
+        self.bytes_received += record["bytes_received"]
+        self.retries += record["retries"]
+        if record["error"] is not None:
+            self.errors += 1
+        # Reservoir sampling keeps a uniform sample of all latencies in bounded memory
+        if len(self.sample) < self.sample_size:
+            self.sample.append(record["latency"])
+        else:
+            index = random.randrange(self.count)
+            if index < self.sample_size:
+                self.sample[index] = record["latency"]
+
+    def percentile(self, fraction):
+        if not self.sample:
+            return None
+        ordered = sorted(self.sample)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class RequestMetrics:
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, sample_size=2048):
+        self.buckets = tuple(sorted(buckets))
+        self.sample_size = sample_size
+        self.endpoints = {}
+        self.workflows = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, record):
+        with self._lock:
+            stats = self.endpoints.get(record["endpoint"])
+            if stats is None:
+                stats = self.endpoints[record["endpoint"]] = _EndpointStats(self.buckets, self.sample_size)
+            stats.add(record, self.buckets)
+
+    def reset(self):
+        with self._lock:
+            self.endpoints = {}
+            self.workflows = {}
+
+    @contextlib.contextmanager
+    def workflow(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                stats = self.workflows.setdefault(name, {"count": 0, "total_seconds": 0.0, "last_seconds": 0.0})
+                stats["count"] += 1
+                stats["total_seconds"] += elapsed
+                stats["last_seconds"] = elapsed
+
+    def snapshot(self):
+        with self._lock:
+            endpoints = {}
+            for endpoint, stats in self.endpoints.items():
+                endpoints[endpoint] = {"count": stats.count,
+                                       "statuses": dict(stats.statuses),
+                                       "errors": stats.errors,
+                                       "retries": stats.retries,
+                                       "bytes_sent": stats.bytes_sent,
+                                       "bytes_received": stats.bytes_received,
+                                       "latency_sum": stats.latency_sum,
+                                       "latency_mean": stats.latency_sum / stats.count,
+                                       "latency_p50": stats.percentile(0.50),
+                                       "latency_p95": stats.percentile(0.95),
+                                       "latency_p99": stats.percentile(0.99)}
+            return {"endpoints": endpoints, "workflows": {name: dict(stats) for name, stats in self.workflows.items()}}
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.snapshot(), **kwargs)
+
+    def to_prometheus(self, prefix="gluware_api"):
+        def labels(**values):
+            return "{" + ",".join('{}="{}"'.format(key, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+                                  for key, value in values.items()) + "}"
+
+        lines = []
+        with self._lock:
+            lines.append("# HELP {}_request_duration_seconds Gluware REST API request latency".format(prefix))
+            lines.append("# TYPE {}_request_duration_seconds histogram".format(prefix))
+            for endpoint, stats in sorted(self.endpoints.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), stats.bucket_counts):
+                    cumulative += count
+                    lines.append("{}_request_duration_seconds_bucket{} {}".format(
+                        prefix, labels(endpoint=endpoint, le=bound), cumulative))
+                lines.append("{}_request_duration_seconds_sum{} {}".format(
+                    prefix, labels(endpoint=endpoint), stats.latency_sum))
+                lines.append("{}_request_duration_seconds_count{} {}".format(
+                    prefix, labels(endpoint=endpoint), stats.count))
+            lines.append("# HELP {}_requests_total Gluware REST API requests by response status".format(prefix))
+            lines.append("# TYPE {}_requests_total counter".format(prefix))
+            for endpoint, stats in sorted(self.endpoints.items()):
+                for status, count in sorted(stats.statuses.items()):
+                    lines.append("{}_requests_total{} {}".format(
+                        prefix, labels(endpoint=endpoint, status=status), count))
+            for name, attribute, description in (("request_retries_total", "retries", "retries"),
+                                                 ("request_bytes_sent_total", "bytes_sent", "request body bytes"),
+                                                 ("request_bytes_received_total", "bytes_received",
+                                                  "response body bytes")):
+                lines.append("# HELP {}_{} Gluware REST API {}".format(prefix, name, description))
+                lines.append("# TYPE {}_{} counter".format(prefix, name))
+                for endpoint, stats in sorted(self.endpoints.items()):
+                    lines.append("{}_{}{} {}".format(prefix, name, labels(endpoint=endpoint),
+                                                      getattr(stats, attribute)))
+            if self.workflows:
+                lines.append("# HELP {}_workflow_duration_seconds Duration of timed workflows".format(prefix))
+                lines.append("# TYPE {}_workflow_duration_seconds summary".format(prefix))
+                for name, stats in sorted(self.workflows.items()):
+                    lines.append("{}_workflow_duration_seconds_sum{} {}".format(
+                        prefix, labels(workflow=name), stats["total_seconds"]))
+                    lines.append("{}_workflow_duration_seconds_count{} {}".format(
+                        prefix, labels(workflow=name), stats["count"]))
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,191 @@
+# /* Copyright (C) 2019 Gluware - All Rights Reserved
+# * This code is provided “as is” with no implied warranties or fitness
+# * for a particular purpose. Gluware, Inc. is under no obligation to
+# * provide maintenance, support, updates, enhancements or modifications.
+# */
+
+# REQUIRED PYTHON VERSION: 3.x
+# Supports Gluware REST API v1
+# Required Python modules:
+# requests, urllib3
+
+# This module provides a resilience layer for the requests.Session used by APIClient. It is enabled with
+# APIClient.enable_resilience(...), which mounts a ResilientHTTPAdapter on the client's session in place of
+# the plain pooled HTTPAdapter. Every request sent through the session then goes through, in order:
+# - CircuitBreaker: after failure_threshold consecutive failures (connection errors or 5xx responses) the
+#   circuit opens and requests fail immediately with CircuitOpenError for reset_timeout seconds. After that a
+#   single trial request is let through; its success closes the circuit again, its failure re-opens it.
+# - TokenBucket: a client-side rate limit of rate requests per second with bursts of up to burst requests,
+#   shared by all threads using the client. Requests block until a token is available.
+# - Retries: requests with an idempotent method (GET, PUT, DELETE, HEAD, OPTIONS by default) that fail with a
+#   connection error or a retry_statuses response (429, 502, 503, 504 by default) are retried up to
+#   max_retries times. The delay before a retry is the server's Retry-After value when present (capped at
+#   max_retry_after), otherwise exponential back-off with full jitter: a random delay between 0 and
+#   min(max_backoff, backoff_base * 2 ** attempt) seconds.
+# The number of retries a request needed is recorded on the returned response as response.retries, or on the
+# exception as e.retries when the request still fails.
+#
+# Example:
+#     client.enable_resilience(rate=50, burst=100, max_retries=5)
+
+import email.utils
+import random
+import threading
+import time
+
+import requests
+
+IDEMPOTENT_METHODS = ("GET", "PUT", "DELETE", "HEAD", "OPTIONS")
+RETRY_STATUSES = (429, 502, 503, 504)
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    pass
+
+
+class TokenBucket:
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = None
+        self._trial_in_progress = False
+        self._lock = threading.Lock()
+
+    def before_request(self):
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    raise CircuitOpenError("Circuit open: Gluware Control failed {} consecutive requests"
+                                           .format(self.failures))
+                self.state = self.HALF_OPEN
+                self._trial_in_progress = False
+            if self.state == self.HALF_OPEN:
+                if self._trial_in_progress:
+                    raise CircuitOpenError("Circuit half-open: waiting for the trial request to complete")
+                self._trial_in_progress = True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_progress = False
+
+    def release_trial(self):
+        # Ends a trial request that neither succeeded nor failed, so that the next request can be the trial
+        with self._lock:
+            self._trial_in_progress = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+            self._trial_in_progress = False
+
+
+def retry_after_seconds(response):
+    # Returns the Retry-After header of a response in seconds, or None if absent or unparseable
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at is None:
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class ResilientHTTPAdapter(requests.adapters.HTTPAdapter):
+
+    def __init__(self, rate=None, burst=None, max_retries=3, backoff_base=0.5, max_backoff=30.0,
+                 max_retry_after=120.0, retry_methods=IDEMPOTENT_METHODS, retry_statuses=RETRY_STATUSES,
+                 failure_threshold=5, reset_timeout=30.0, **kwargs):
+        super().__init__(**kwargs)
+        self.rate_limiter = TokenBucket(rate, burst) if rate else None
+        self.circuit_breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.retry_count = max_retries
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+        self.max_retry_after = max_retry_after
+        self.retry_methods = {method.upper() for method in retry_methods}
+        self.retry_statuses = set(retry_statuses)
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.max_backoff, self.backoff_base * 2 ** attempt))
+
+    def send(self, request, **kwargs):
+        retryable = request.method.upper() in self.retry_methods
+        attempt = 0
+        while True:
+            try:
+                self.circuit_breaker.before_request()
+                if self.rate_limiter is not None:
+                    self.rate_limiter.acquire()
+                response = super().send(request, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self.circuit_breaker.record_failure()
+                if not retryable or attempt >= self.retry_count:
+                    e.retries = attempt
+                    raise
+                delay = self._backoff(attempt)
+            except CircuitOpenError as e:
+                # No request was sent, so there is no trial to release
+                e.retries = attempt
+                raise
+            except BaseException as e:
+                # Not a failure of Gluware Control (e.g. InvalidURL), but a half-open trial must not stay taken
+                self.circuit_breaker.release_trial()
+                e.retries = attempt
+                raise
+            else:
+                if response.status_code >= 500:
+                    self.circuit_breaker.record_failure()
+                else:
+                    self.circuit_breaker.record_success()
+                if not retryable or attempt >= self.retry_count or response.status_code not in self.retry_statuses:
+                    response.retries = attempt
+                    return response
+                delay = retry_after_seconds(response)
+                if delay is None:
+                    delay = self._backoff(attempt)
+                delay = min(delay, self.max_retry_after)
+                # Release the connection back to the pool before waiting
+                response.close()
+            attempt += 1
+            time.sleep(delay)
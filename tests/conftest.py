@@ -0,0 +1,34 @@
+import os
+import sys
+
+import pytest
+
+# The client modules live at the top of the repository rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gluware_device_rest_api_client  # noqa: E402
+import gluware_mock_controller  # noqa: E402
+
+
+@pytest.fixture
+def controller():
+    with gluware_mock_controller.MockController(devices=200, organizations=20, discovery_seconds=0.2,
+                                                discovery_failure_rate=0.0) as controller:
+        yield controller
+
+
+@pytest.fixture
+def client(controller):
+    return gluware_device_rest_api_client.APIClient(controller.url, "user", "password", "", None)
+
+
+@pytest.fixture
+def ambiguous_organizations(controller):
+    # GluwareSystemOrganization/{Lab,Production}/US, and an East whose parentName "US" matches both
+    organizations = controller.data.organizations
+    root = next(org for org in organizations.values() if not org["parentName"])
+    for org_id, name, parent in (("lab", "Lab", root["name"]), ("production", "Production", root["name"]),
+                                 ("lab-us", "US", "Lab"), ("production-us", "US", "Production"),
+                                 ("east", "East", "US")):
+        organizations[org_id] = {"id": org_id, "name": name, "parentName": parent}
+    return organizations
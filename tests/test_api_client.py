@@ -0,0 +1,220 @@
+import io
+import json
+import random
+
+import pytest
+import requests
+
+import gluware_device_rest_api_client
+
+
+def test_iter_devices_streams_all_devices(client, controller):
+    ids = [device["id"] for device in client.iter_devices(None)]
+    assert sorted(ids) == sorted(controller.data.devices)
+
+
+def test_iter_devices_pages(client, controller):
+    pages = []
+    client.add_request_observer(lambda record: pages.append(record["url"]))
+    ids = [device["id"] for device in client.iter_devices(None, page_size=30)]
+    assert sorted(ids) == sorted(controller.data.devices)
+    # 200 devices in pages of 30: six full pages and a short one
+    assert len(pages) == 7
+
+
+def test_iter_devices_raises_when_paging_is_ignored(client):
+    get_devices = client.get_devices
+    client.get_devices = lambda query: get_devices({key: value for key, value in query.items() if key != "offset"})
+    with pytest.raises(gluware_device_rest_api_client.APIClientError):
+        list(client.iter_devices(None, page_size=30))
+
+
+def test_iter_devices_raises_on_error(client):
+    client.control_url = client.control_url.replace("api/devices/", "api/missing/")
+    with pytest.raises(gluware_device_rest_api_client.APIClientError):
+        list(client.iter_devices(None))
+
+
+def test_iter_json_array_handles_any_chunking():
+    document = json.dumps([1.5, -2e-3, 1E+5, 0, 12345678901234567890, True, None, "a\"b,]", [[], {}],
+                           {"name": "r\u00e9seau", "port": 22, "proxyList": [{"ip": "10.0.0.1"}]}, -0.25e10])
+    rng = random.Random(0)
+    for _ in range(500):
+        cuts = sorted(rng.sample(range(1, len(document)), rng.randint(1, 20)))
+        chunks = [document[start:end] for start, end in zip([0] + cuts, cuts + [len(document)])]
+        assert list(gluware_device_rest_api_client.iter_json_array(chunks)) == json.loads(document)
+    for chunks in (["[1.", "5]"], ["[1e", "5]"], ["[1E", "+5]"], ["[-", "1]"], ["[1", "2.", "5e", "-1]"]):
+        assert list(gluware_device_rest_api_client.iter_json_array(chunks)) == json.loads("".join(chunks))
+
+
+def test_bulk_create_update_delete(client, controller):
+    org_id = next(iter(controller.data.organizations))
+    results = list(client.bulk_create_devices([{"name": "bulk-{}".format(i), "orgId": org_id} for i in range(20)]
+                                              + [{"name": "no org"}]))
+    assert sorted(result["index"] for result in results) == list(range(21))
+    created = [result["response_content"]["id"] for result in results if result["response_code"] == 200]
+    assert len(created) == 20
+
+    summary = client.bulk_update_devices((device_id, {"description": "bulk"}) for device_id in created).wait()
+    assert summary["succeeded"] == 20 and summary["failed"] == 0
+    assert all(controller.data.devices[device_id]["description"] == "bulk" for device_id in created)
+
+    summary = client.bulk_delete_devices(created + ["does-not-exist"]).wait()
+    assert summary["succeeded"] == 20
+    assert [failure["item"] for failure in summary["failures"]] == ["does-not-exist"]
+    assert not set(created) & set(controller.data.devices)
+
+
+def test_bulk_results_can_only_be_iterated_once(client):
+    results = client.bulk_get_devices([])
+    results.wait()
+    with pytest.raises(RuntimeError):
+        list(results)
+
+
+def test_organization_cache_answers_repeated_lookups_from_memory(client, controller):
+    org = next(org for org in controller.data.organizations.values() if org["parentName"])
+    requests = []
+    client.add_request_observer(requests.append)
+    for _ in range(3):
+        resp = client.get_organization_id_by_name(org["name"], org["parentName"])
+        assert resp == {"response_code": 200, "response_content": org["id"]}
+    assert len(requests) == 1
+    assert client.organization_cache.hits == 2
+    assert client.get_organization_id_by_name("missing", None)["response_code"] == 404
+
+
+def test_get_organization_loads_the_cache_once(client, controller):
+    org_id = next(iter(controller.data.organizations))
+    endpoints = []
+    client.add_request_observer(lambda record: endpoints.append(record["endpoint"]))
+    for _ in range(5):
+        assert client.get_organization(org_id)["response_content"]["id"] == org_id
+    assert endpoints == ["GET /api/organizations"]
+    assert (client.organization_cache.hits, client.organization_cache.misses) == (4, 1)
+
+    # An organization created after the list was loaded is fetched on its own once
+    new_id = "0c5f4bb2-9a39-4c3f-8b0e-4a1d2b3c4d5e"
+    controller.data.organizations[new_id] = {"id": new_id, "name": "New", "parentName": None}
+    for _ in range(2):
+        assert client.get_organization(new_id)["response_content"]["name"] == "New"
+    assert endpoints[1:] == ["GET /api/organizations/{id}"]
+
+
+def test_organization_by_path_reports_ambiguous_parents(client, ambiguous_organizations):
+    assert client.get_organization_by_path("GluwareSystemOrganization/Lab/US")["response_code"] == 200
+    assert client.get_organization_by_path("GluwareSystemOrganization/Production/US/East")["response_code"] == 409
+    assert client.get_organization_by_path("GluwareSystemOrganization/Nowhere")["response_code"] == 404
+    assert [org["name"] for org in client.organization_cache.unresolved] == ["East"]
+
+
+def test_reconcile_devices_sends_only_changed_fields(client, controller):
+    devices = list(controller.data.devices.values())[:3]
+    desired = [dict(devices[0], description="changed"), dict(devices[1]), {"id": "missing", "name": "x"}]
+    sent = []
+    client.add_request_observer(lambda record: sent.append(record["method"]))
+
+    summary = client.reconcile_devices(desired, dry_run=True)
+    assert (summary["changed"], summary["unchanged"], summary["missing"]) == (1, 1, 1)
+    assert summary["diffs"][devices[0]["id"]] == [{"field": "description", "current": devices[0]["description"],
+                                                   "desired": "changed"}]
+    assert "PUT" not in sent
+
+    summary = client.reconcile_devices(desired)
+    assert summary["updated"] == 1 and sent.count("PUT") == 1
+    assert controller.data.devices[devices[0]["id"]]["description"] == "changed"
+
+
+def test_reconcile_by_id_reports_fetch_errors_as_failed(client, controller):
+    device = next(iter(controller.data.devices.values()))
+    desired = [dict(device, description="changed"), {"id": "missing", "name": "x"}]
+    controller.server.error_rate = 1.0
+    summary = client.reconcile_devices(desired, fetch_by_id=True)
+    assert (summary["missing"], summary["failed"]) == (0, 2)
+    assert sorted(failure["item"] for failure in summary["failures"]) == sorted([device["id"], "missing"])
+
+    controller.server.error_rate = 0.0
+    summary = client.reconcile_devices(desired, fetch_by_id=True)
+    assert (summary["missing_ids"], summary["updated"], summary["failed"]) == (["missing"], 1, 0)
+
+
+def test_cache_revalidates_and_invalidates(client, controller):
+    cache = client.enable_cache()
+    device_id = next(iter(controller.data.devices))
+    first = client.get_device(device_id)
+    second = client.get_device(device_id)
+    assert first["response_content"] == second["response_content"]
+    assert second.response.cache_status == "revalidated"
+    assert (cache.misses, cache.revalidations) == (1, 1)
+
+    client.update_device(device_id, {"description": "updated"})
+    third = client.get_device(device_id)
+    assert third["response_content"]["description"] == "updated"
+    assert getattr(third.response, "cache_status", None) is None
+
+
+def test_cache_invalidates_when_a_write_times_out(client, controller):
+    # With max_age the cached device would be returned without asking the server, unless it was invalidated
+    cache = client.enable_cache(max_age=60)
+    device_id = next(iter(controller.data.devices))
+    client.get_device(device_id)
+    send = cache.adapter.send
+
+    def applied_then_timed_out(request, **kwargs):
+        response = send(request, **kwargs)
+        if request.method == "PUT":
+            raise requests.exceptions.ReadTimeout("read timed out")
+        return response
+
+    cache.adapter.send = applied_then_timed_out
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        client.update_device(device_id, {"description": "updated"})
+    assert client.get_device(device_id)["response_content"]["description"] == "updated"
+
+
+def test_response_content_is_decoded_only_when_read(client, controller, monkeypatch):
+    decoded = []
+    loads = gluware_device_rest_api_client.gluware_json_codec.loads
+    monkeypatch.setattr(gluware_device_rest_api_client.gluware_json_codec, "loads",
+                        lambda content: decoded.append(content) or loads(content))
+    device_id = next(iter(controller.data.devices))
+    response = client.get_device(device_id)
+    assert response["response_code"] == 200 and not decoded
+    assert response["response_content"]["id"] == device_id
+    assert response["response_content"]["id"] == device_id
+    assert len(decoded) == 1
+    # The body bytes are released once they have been decoded
+    assert response.response._content is None
+
+
+def test_raw_content_and_save(client, controller, tmp_path):
+    device_id = next(iter(controller.data.devices))
+    response = client.get_device(device_id)
+    raw = response.raw_content
+    assert json.loads(raw)["id"] == device_id
+    response.save(tmp_path / "device.json")
+    assert (tmp_path / "device.json").read_bytes() == raw
+
+    content = response["response_content"]
+    assert json.loads(response.raw_content) == content
+    saved = io.BytesIO()
+    response.save(saved)
+    assert json.loads(saved.getvalue()) == content
+
+    missing = client.get_device("missing")
+    assert missing["response_code"] == 404
+    assert missing.raw_content.decode("utf-8") == missing["response_content"]
+
+
+def test_set_codec_switches_the_decoder(client, controller):
+    codec = gluware_device_rest_api_client.gluware_json_codec
+    previous = codec.CODEC_NAME
+    device_id = next(iter(controller.data.devices))
+    expected = client.get_device(device_id)["response_content"]
+    try:
+        codec.set_codec("json")
+        assert codec.CODEC_NAME == "json"
+        assert client.get_device(device_id)["response_content"] == expected
+        assert client.create_device({"name": "codec-test", "orgId": expected["orgId"]})["response_code"] == 200
+    finally:
+        codec.set_codec(previous)
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+import gluware_device_async_rest_api_client  # noqa: E402
+import gluware_json_codec  # noqa: E402
+
+
+def async_client(url):
+    return gluware_device_async_rest_api_client.AsyncAPIClient(url, "user", "password", "", None,
+                                                               max_concurrency=8)
+
+
+def test_requests(controller):
+    org = next(org for org in controller.data.organizations.values() if org["parentName"])
+
+    async def run():
+        async with async_client(controller.url) as client:
+            return (await client.get_devices(None),
+                    await client.get_organization_id_by_name(org["name"], org["parentName"]))
+
+    devices, org_id = asyncio.run(run())
+    assert devices["response_code"] == 200 and len(devices["response_content"]) == len(controller.data.devices)
+    assert org_id == {"response_code": 200, "response_content": org["id"]}
+
+
+def test_bulk_helpers_keep_the_input_order(controller):
+    org_id = next(iter(controller.data.organizations))
+
+    async def run():
+        async with async_client(controller.url) as client:
+            created = await client.create_devices([{"name": "async-{}".format(i), "orgId": org_id} for i in range(10)])
+            ids = [result["response_content"]["id"] for result in created]
+            updated = await client.update_devices((device_id, {"description": "async"}) for device_id in ids)
+            fetched = await client.get_devices_by_ids(ids)
+            deleted = await client.delete_devices(ids)
+            return ids, updated, fetched, deleted
+
+    ids, updated, fetched, deleted = asyncio.run(run())
+    assert [result["response_code"] for result in updated + deleted] == [200] * 20
+    assert [device["response_content"]["id"] for device in fetched] == ids
+    assert all(device["response_content"]["description"] == "async" for device in fetched)
+    assert not set(ids) & set(controller.data.devices)
+
+
+def test_bulk_helpers_return_per_item_errors(controller, monkeypatch):
+    good, bad = list(controller.data.devices)[:2]
+    loads = gluware_json_codec.loads
+
+    def loads_failing_for_bad(body):
+        if bad.encode() in body:
+            raise ValueError("Expecting value")
+        return loads(body)
+
+    monkeypatch.setattr(gluware_json_codec, "loads", loads_failing_for_bad)
+
+    async def run():
+        async with async_client(controller.url) as client:
+            return await client.get_devices_by_ids([good, bad, "missing"])
+
+    results = asyncio.run(run())
+    assert [result["response_code"] for result in results] == [200, None, 404]
+    assert results[1]["response_content"] == "Expecting value"
+
+
+def test_connection_errors_are_per_item(controller):
+    url = controller.url
+    controller.stop()
+
+    async def run():
+        async with async_client(url) as client:
+            return await client.get_devices_by_ids(["a", "b"])
+
+    assert [result["response_code"] for result in asyncio.run(run())] == [None, None]
@@ -0,0 +1,35 @@
+import io
+import json
+
+import gluware_cli
+
+
+def run_cli(monkeypatch, capsys, controller, argv, stdin=""):
+    monkeypatch.setattr("sys.stdin", io.StringIO(stdin))
+    code = gluware_cli.main(["--config", "/nonexistent", "--host", controller.url, "--username", "user",
+                             "--password", "password"] + argv)
+    return code, [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+
+def test_update_reports_records_without_id(monkeypatch, capsys, controller):
+    device_id = next(iter(controller.data.devices))
+    stdin = json.dumps({"id": device_id, "description": "cli"}) + "\n" + json.dumps({"description": "no id"}) + "\n"
+    code, records = run_cli(monkeypatch, capsys, controller, ["devices", "update"], stdin)
+    assert code == 1
+    assert sorted((record["index"], record["response_code"]) for record in records) == [(0, 200), (1, None)]
+    assert controller.data.devices[device_id]["description"] == "cli"
+
+
+def test_reconcile_reports_records_without_id(monkeypatch, capsys, controller):
+    code, records = run_cli(monkeypatch, capsys, controller, ["devices", "reconcile", "--dry-run"],
+                            json.dumps({"description": "no id"}) + "\n")
+    assert code == 1
+    assert records == [{"index": 0, "response_code": None, "response_content": "Input record has no id"}]
+
+
+def test_get_fails_for_missing_devices(monkeypatch, capsys, controller):
+    device_id = next(iter(controller.data.devices))
+    code, records = run_cli(monkeypatch, capsys, controller, ["devices", "get", device_id, "missing"])
+    assert code == 1
+    assert sorted(record["response_code"] for record in records) == [200, 404]
+    assert run_cli(monkeypatch, capsys, controller, ["devices", "get", device_id])[0] == 0
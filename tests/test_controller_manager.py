@@ -0,0 +1,27 @@
+import pytest
+
+from gluware_controller_manager import ControllerManager
+
+
+def test_run_tags_results_with_controller(client):
+    with ControllerManager() as manager:
+        manager.add_client("a", client)
+        results = list(manager.get_organizations())
+    assert [(result["controller"], result["response_code"]) for result in results] == [("a", 200)]
+
+
+def test_local_errors_do_not_reset_failures(client):
+    def broken(client):
+        raise KeyError("not a controller problem")
+
+    with ControllerManager(failure_threshold=3, retry_interval=0.0) as manager:
+        manager.add_client("a", client)
+        health = manager.controllers["a"].health
+        for _ in range(3):
+            health.record_failure("HTTP 503")
+        with pytest.raises(KeyError):
+            list(manager.run(broken))
+        assert health.consecutive_failures == 3 and not health.healthy
+        # The probe slot was released, so the next call probes the controller again
+        assert [result["response_code"] for result in manager.get_organizations()] == [200]
+        assert health.healthy
@@ -0,0 +1,76 @@
+from urllib.parse import parse_qs, urlsplit
+
+import gluware_device_discovery
+
+
+def test_discovery_resolves_every_future(client, controller):
+    device_ids = list(controller.data.devices)[:30]
+    with gluware_device_discovery.DiscoveryOrchestrator(client, batch_size=7, max_in_flight=10,
+                                                        min_poll_interval=0.05, settle_time=0) as orchestrator:
+        futures = orchestrator.discover(device_ids)
+    assert sorted(futures) == sorted(device_ids)
+    for device_id, future in futures.items():
+        assert future.result()["discoveryStatus"] == "discovered"
+
+
+def test_discovery_reports_failures(client, controller):
+    controller.discovery_failure_rate = 1.0
+    device_id = next(iter(controller.data.devices))
+    with gluware_device_discovery.DiscoveryOrchestrator(client, min_poll_interval=0.05,
+                                                        settle_time=0) as orchestrator:
+        future = orchestrator.discover([device_id])[device_id]
+    assert isinstance(future.exception(), gluware_device_discovery.DiscoveryError)
+    assert future.exception().status == "failed"
+
+
+def test_repeated_ids_share_one_discovery(client, controller):
+    device_ids = list(controller.data.devices)[:3]
+    with gluware_device_discovery.DiscoveryOrchestrator(client, min_poll_interval=0.05,
+                                                        settle_time=0) as orchestrator:
+        first = orchestrator.discover(device_ids + device_ids[:1])
+        second = orchestrator.discover(device_ids[:1])
+        orchestrator.wait()
+    assert len(first) == 3
+    assert second[device_ids[0]] is first[device_ids[0]]
+    assert all(future.done() for future in first.values())
+
+
+def polled_endpoints(client):
+    endpoints = []
+    client.add_request_observer(lambda record: endpoints.append(record["endpoint"]))
+    return endpoints
+
+
+def test_polls_by_organization(client, controller):
+    devices = list(controller.data.devices.values())[:40]
+    endpoints = polled_endpoints(client)
+    listings = []
+    client.add_request_observer(lambda record: listings.append(
+        (record["endpoint"], parse_qs(urlsplit(record["url"]).query).get("orgId", [None])[0])))
+    with gluware_device_discovery.DiscoveryOrchestrator(client, min_poll_interval=0.05,
+                                                        settle_time=0) as orchestrator:
+        futures = orchestrator.discover(devices)
+    assert all(future.result()["discoveryStatus"] == "discovered" for future in futures.values())
+    assert "GET /api/devices/{id}" not in endpoints
+    assert {org_id for endpoint, org_id in listings if endpoint == "GET /api/devices"} <= {
+        device["orgId"] for device in devices}
+
+
+def test_devices_given_by_id_are_fetched_by_id_once(client, controller):
+    device_ids = list(controller.data.devices)[:20]
+    endpoints = polled_endpoints(client)
+    with gluware_device_discovery.DiscoveryOrchestrator(client, min_poll_interval=0.05,
+                                                        settle_time=0) as orchestrator:
+        orchestrator.discover(device_ids)
+    assert 0 < endpoints.count("GET /api/devices/{id}") <= len(device_ids)
+    assert "GET /api/devices" in endpoints
+
+
+def test_poll_by_id(client, controller):
+    device_ids = list(controller.data.devices)[:2]
+    endpoints = polled_endpoints(client)
+    with gluware_device_discovery.DiscoveryOrchestrator(client, min_poll_interval=0.05, settle_time=0,
+                                                        poll_by_id=True) as orchestrator:
+        orchestrator.discover(device_ids)
+    assert "GET /api/devices" not in endpoints
+    assert "GET /api/devices/{id}" in endpoints
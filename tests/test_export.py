@@ -0,0 +1,50 @@
+import csv
+import gzip
+import io
+import json
+
+import gluware_cli
+import gluware_device_export
+
+
+def test_csv_export_of_client_devices(client, controller, tmp_path):
+    path = str(tmp_path / "devices.csv.gz")
+    assert gluware_device_export.export_client_devices(client, path, format="csv") == len(controller.data.devices)
+    with gzip.open(path, "rt", newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert sorted(row["id"] for row in rows) == sorted(controller.data.devices)
+    device = controller.data.devices[rows[0]["id"]]
+    assert rows[0]["connectionInformation.ip"] == device["connectionInformation"]["ip"]
+
+
+def test_csv_keeps_nested_columns_missing_from_the_first_device():
+    output = io.BytesIO()
+    gluware_device_export.export_devices([{"id": "a"}, {"id": "b", "connectionInformation": {"ip": "10.0.0.1"}}],
+                                         output, format="csv")
+    rows = list(csv.DictReader(io.StringIO(output.getvalue().decode("utf-8"))))
+    assert rows[1]["connectionInformation.ip"] == "10.0.0.1"
+
+
+def test_csv_writes_unexpected_fields_to_the_extra_column():
+    output = io.BytesIO()
+    devices = [{"id": "a"}, {"id": "b", "custom": 1, "site": {"rack": "r1"}}]
+    assert gluware_device_export.export_devices(devices, output, format="csv") == 2
+    rows = list(csv.DictReader(io.StringIO(output.getvalue().decode("utf-8"))))
+    assert rows[0]["extra"] == ""
+    assert json.loads(rows[1]["extra"]) == {"custom": 1, "site.rack": "r1"}
+
+
+def test_csv_is_read_back_by_the_cli():
+    output = io.BytesIO()
+    devices = [{"id": "a", "connectionInformation": {"ip": "10.0.0.1", "proxyList": []}},
+               {"id": "b", "connectionInformation": {"proxyList": [{"ip": "10.0.0.2"}]}, "site": {"rack": "r1"}}]
+    gluware_device_export.export_devices(devices, output, format="csv")
+    rows = csv.DictReader(io.StringIO(output.getvalue().decode("utf-8")))
+    assert [gluware_cli.unflatten(row) for row in rows] == devices
+
+
+def test_jsonl_projection():
+    output = io.BytesIO()
+    gluware_device_export.export_devices([{"id": "a", "name": "x", "connectionInformation": {"ip": "10.0.0.1"}}],
+                                         output, fields=["id", "connectionInformation.ip"])
+    assert json.loads(output.getvalue()) == {"id": "a", "connectionInformation": {"ip": "10.0.0.1"}}
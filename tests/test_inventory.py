@@ -0,0 +1,60 @@
+import pytest
+
+import gluware_device_inventory
+
+
+@pytest.fixture
+def inventory(client, tmp_path):
+    with gluware_device_inventory.DeviceInventory(client, str(tmp_path / "inventory.db")) as inventory:
+        yield inventory
+
+
+def test_sync_counts_changes(inventory, controller):
+    devices = controller.data.devices
+    counts = inventory.sync()
+    assert (counts["added"], counts["updated"], counts["unchanged"], counts["removed"]) == (len(devices), 0, 0, 0)
+
+    changed, removed = list(devices)[:2]
+    devices[changed] = dict(devices[changed], description="changed")
+    del devices[removed]
+    counts = inventory.sync()
+    assert (counts["added"], counts["updated"], counts["unchanged"], counts["removed"]) == (
+        0, 1, len(devices) - 1, 1)
+    assert inventory.count() == len(devices)
+    assert inventory.get(changed)["description"] == "changed"
+    assert inventory.get(removed) is None
+
+
+def test_indexed_queries(inventory, controller):
+    inventory.sync()
+    device = next(iter(controller.data.devices.values()))
+    assert sorted(d["id"] for d in inventory.devices_in_org(device["orgId"])) == sorted(
+        d["id"] for d in controller.data.devices.values() if d["orgId"] == device["orgId"])
+    status = device.get("discoveryStatus")
+    assert sorted(d["id"] for d in inventory.devices_with_discovery_status(status)) == sorted(
+        d["id"] for d in controller.data.devices.values() if d.get("discoveryStatus") == status)
+    assert [d["id"] for d in inventory.find(id=device["id"], name=device["name"])] == [device["id"]]
+    with pytest.raises(ValueError):
+        list(inventory.find(description="x"))
+
+
+def test_filtered_sync_keeps_its_own_last_sync(inventory, controller):
+    org_id = next(iter(controller.data.devices.values()))["orgId"]
+    inventory.sync()
+    full_sync = inventory.last_sync()
+    inventory.sync({"orgId": org_id})
+    assert inventory.last_sync() == full_sync
+    assert inventory.last_sync({"orgId": org_id}) > full_sync
+
+
+def test_failed_sync_writes_nothing(inventory, client, controller):
+    def failing_iter_devices(query_details, **options):
+        yield from list(controller.data.devices.values())[:5]
+        raise ConnectionError("connection lost")
+
+    client.iter_devices = failing_iter_devices
+    inventory.batch_size = 2
+    with pytest.raises(ConnectionError):
+        inventory.sync()
+    assert inventory.count() == 0
+    assert inventory.last_sync() is None
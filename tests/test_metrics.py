@@ -0,0 +1,67 @@
+import json
+
+import pytest
+import requests
+
+import gluware_rest_api_metrics
+
+DEVICE_ID = "0b6d3c3e-4c1f-4f4e-9c55-2f1a8a3b5d7e"
+
+
+def record(endpoint, latency, status=200, retries=0):
+    return {"method": endpoint.split()[0], "endpoint": endpoint, "url": None, "status": status, "latency": latency,
+            "bytes_sent": 0, "bytes_received": 10, "retries": retries, "error": None, "cache": None}
+
+
+def test_endpoint_template():
+    template = gluware_rest_api_metrics.endpoint_template
+    assert template("get", "http://host/api/devices/" + DEVICE_ID + "?x=1") == "GET /api/devices/{id}"
+    assert template("PUT", "http://host/api/devices/0123456789abcdef0123") == "PUT /api/devices/{id}"
+    assert template("GET", "http://host/api/organizations/42") == "GET /api/organizations/{id}"
+    assert template("GET", "http://host/api/devices/core-1") == "GET /api/devices/core-1"
+    assert template("GET", "http://host/api/devices") == "GET /api/devices"
+
+
+def test_percentiles():
+    metrics = gluware_rest_api_metrics.RequestMetrics(sample_size=1000)
+    for latency in range(100, 0, -1):
+        metrics(record("GET /api/devices", latency / 1000))
+    stats = metrics.snapshot()["endpoints"]["GET /api/devices"]
+    assert stats["count"] == 100
+    assert (stats["latency_p50"], stats["latency_p95"], stats["latency_p99"]) == (0.051, 0.096, 0.1)
+    assert stats["latency_mean"] == pytest.approx(0.0505)
+
+
+def test_prometheus_and_json_export(client, controller):
+    metrics = client.enable_metrics(buckets=(0.5, 60.0))
+    with metrics.workflow("lookup"):
+        client.get_organizations()
+        client.get_organizations()
+        client.get_device(DEVICE_ID)
+
+    snapshot = json.loads(metrics.to_json())
+    assert snapshot["endpoints"]["GET /api/organizations"]["statuses"] == {"200": 2}
+    assert snapshot["endpoints"]["GET /api/devices/{id}"]["statuses"] == {"404": 1}
+    assert snapshot["workflows"]["lookup"]["count"] == 1
+
+    lines = metrics.to_prometheus().splitlines()
+    assert 'gluware_api_request_duration_seconds_bucket{endpoint="GET /api/organizations",le="+Inf"} 2' in lines
+    assert 'gluware_api_request_duration_seconds_bucket{endpoint="GET /api/organizations",le="60.0"} 2' in lines
+    assert 'gluware_api_request_duration_seconds_count{endpoint="GET /api/organizations"} 2' in lines
+    assert 'gluware_api_requests_total{endpoint="GET /api/devices/{id}",status="404"} 1' in lines
+    assert 'gluware_api_request_retries_total{endpoint="GET /api/organizations"} 0' in lines
+    assert 'gluware_api_workflow_duration_seconds_count{workflow="lookup"} 1' in lines
+
+
+def test_failed_request_reports_its_retries(client, monkeypatch):
+    client.enable_resilience(max_retries=2, backoff_base=0, failure_threshold=10)
+    metrics = client.enable_metrics()
+
+    def refuse(self, request, **kwargs):
+        raise requests.exceptions.ConnectionError("connection refused")
+
+    monkeypatch.setattr(requests.adapters.HTTPAdapter, "send", refuse)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.get_device(DEVICE_ID)
+    stats = metrics.snapshot()["endpoints"]["GET /api/devices/{id}"]
+    assert (stats["statuses"], stats["errors"], stats["retries"]) == ({"error": 1}, 1, 2)
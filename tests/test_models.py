@@ -0,0 +1,39 @@
+import copy
+
+import gluware_models
+
+DEVICE = {"id": "d1", "name": "core-1", "orgId": "o1", "description": None, "custom": [1, 2],
+          "connectionInformation": {"ip": "10.0.0.1", "port": None, "proxyList": [], "vendorField": "x"}}
+
+
+def test_round_trip_keeps_nulls_and_unknown_fields():
+    device = gluware_models.Device.from_dict(DEVICE)
+    assert device.to_dict() == DEVICE
+    assert device.description is None
+    assert device.discovery_status is gluware_models.ABSENT and not device.discovery_status
+    assert device.get("description", "default") is None
+    assert device.get("discoveryStatus", "default") == "default"
+    assert device.get("custom") == [1, 2]
+    assert copy.deepcopy(device).to_dict() == DEVICE
+
+
+def test_organization_round_trip():
+    organization = {"id": "o1", "name": "Lab", "parentName": None}
+    assert gluware_models.Organization.from_dict(organization).to_dict() == organization
+
+
+def test_to_columns():
+    devices = [gluware_models.Device.from_dict(DEVICE), gluware_models.Device.from_dict({"id": "d2", "extraField": 1})]
+    columns = gluware_models.to_columns(devices)
+    assert columns["id"] == ["d1", "d2"]
+    assert columns["connectionInformation.ip"] == ["10.0.0.1", None]
+    assert columns["description"] == [None, None]
+    assert columns["custom"] == [[1, 2], None]
+    assert columns["extraField"] == [None, 1]
+    assert gluware_models.to_columns(devices, fields=["id", "orgId"]) == {"id": ["d1", "d2"], "orgId": ["o1", None]}
+
+
+def test_iter_device_models(client, controller):
+    devices = list(gluware_models.iter_device_models(client))
+    assert sorted(device.id for device in devices) == sorted(controller.data.devices)
+    assert all(device.to_dict() == controller.data.devices[device.id] for device in devices)
@@ -0,0 +1,37 @@
+import pytest
+
+import gluware_organization_tree
+
+
+def test_tree_paths_match_parent_names(client, controller):
+    tree = gluware_organization_tree.OrganizationTree.from_client(client)
+    assert len(tree) == len(controller.data.organizations)
+    assert not tree.unresolved
+    for node in tree.by_id.values():
+        parent_name = controller.data.organizations[node.id]["parentName"]
+        assert (node.parent.name if node.parent else None) == parent_name
+        assert tree.find(node.path) is node
+
+
+def test_subtree_devices_covers_every_descendant(client, controller):
+    tree = gluware_organization_tree.OrganizationTree.from_client(client)
+    root = tree.roots[0]
+    child = root.children[0]
+    expected = {node.id for node in tree.descendants(child)}
+    devices = list(tree.subtree_devices(client, child.path, max_workers=4))
+    assert sorted(device["id"] for device in devices) == sorted(
+        device["id"] for device in controller.data.devices.values() if device["orgId"] in expected)
+
+
+def test_subtree_devices_refuses_a_partial_subtree(client, ambiguous_organizations):
+    tree = gluware_organization_tree.OrganizationTree.from_client(client)
+    assert [org["id"] for org in tree.unresolved] == ["east"]
+    with pytest.raises(gluware_organization_tree.UnresolvedOrganizationError):
+        list(tree.subtree_devices(client, "GluwareSystemOrganization/Production"))
+    assert list(tree.subtree_devices(client, "GluwareSystemOrganization/Production", allow_unresolved=True)) == []
+
+
+def test_parent_ids_resolve_ambiguous_parents(client, ambiguous_organizations):
+    ambiguous_organizations["east"]["parentId"] = "production-us"
+    tree = gluware_organization_tree.OrganizationTree.from_client(client)
+    assert tree.get("east").path == "GluwareSystemOrganization/Production/US/East"
@@ -0,0 +1,43 @@
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from gluware_device_query import DeviceQuery, Field
+
+
+def sent_queries(client):
+    queries = []
+    client.add_request_observer(lambda record: queries.append(parse_qs(urlsplit(record["url"]).query)))
+    return queries
+
+
+def test_only_org_id_is_pushed_down_by_default():
+    query = DeviceQuery(where=(Field("orgId") == "org") & (Field("name") == "core-1"))
+    assert query.server_query() == {"orgId": "org"}
+    everything = DeviceQuery(where=(Field("orgId") == "org") & (Field("name") == "core-1"), pushdown_fields=None)
+    assert everything.server_query() == {"orgId": "org", "name": "core-1"}
+
+
+def test_run_matches_local_evaluation(client, controller):
+    org_id = next(iter(controller.data.organizations))
+    query = DeviceQuery(where=(Field("orgId") == org_id) & (Field("discoveryStatus") != "success"), select=["id"])
+    queries = sent_queries(client)
+    ids = sorted(device["id"] for device in query.run(client))
+    assert ids == sorted(device["id"] for device in controller.data.devices.values()
+                         if device["orgId"] == org_id and device.get("discoveryStatus") != "success")
+    assert all(query_["orgId"] == [org_id] for query_ in queries)
+
+
+def test_query_details_are_kept(client, controller):
+    org_id = next(iter(controller.data.organizations))
+    query = DeviceQuery(where=Field("orgId") == org_id)
+    queries = sent_queries(client)
+    query.count(client, query_details={"orgId": org_id, "name": "missing"})
+    assert queries[0]["orgId"] == [org_id] and queries[0]["name"] == ["missing"]
+
+
+def test_conflicting_query_details_raise(client, controller):
+    org_a, org_b = list(controller.data.organizations)[:2]
+    query = DeviceQuery(where=Field("orgId") == org_a)
+    with pytest.raises(ValueError):
+        query.count(client, query_details={"orgId": org_b})
@@ -0,0 +1,39 @@
+import pytest
+import requests
+
+from gluware_rest_api_resilience import CircuitBreaker, CircuitOpenError, ResilientHTTPAdapter
+
+
+def test_circuit_opens_and_trial_closes_it():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.0)
+    breaker.before_request()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    breaker.before_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_unexpected_error_ends_the_trial(monkeypatch):
+    def invalid_url(self, request, **kwargs):
+        raise requests.exceptions.InvalidURL("bad url")
+
+    monkeypatch.setattr(requests.adapters.HTTPAdapter, "send", invalid_url)
+    adapter = ResilientHTTPAdapter(failure_threshold=1, reset_timeout=0.0)
+    adapter.circuit_breaker.record_failure()
+    request = requests.Request("GET", "http://gluware.invalid/api/devices/").prepare()
+    with pytest.raises(requests.exceptions.InvalidURL):
+        adapter.send(request)
+    assert adapter.circuit_breaker.state == CircuitBreaker.HALF_OPEN
+    # The trial slot was released, so the next request is let through as the trial
+    adapter.circuit_breaker.before_request()
+
+
+def test_retries_unavailable_responses(client, controller):
+    client.enable_resilience(max_retries=10, max_retry_after=0.01, failure_threshold=20)
+    controller.server.error_rate = 0.3
+    assert client.get_organizations()["response_code"] == 200